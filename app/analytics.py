@@ -1,6 +1,6 @@
 from collections import Counter, defaultdict
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 
 def summarize_top_tracks(tracks: List[Dict[str, Any]], audio_features: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -171,102 +171,206 @@ def build_wrapped_payload(
     }
 
 
-def summarize_month_from_plays(plays: List[Dict[str, Any]], limit: int = 20) -> Dict[str, Any]:
+def summarize_month_from_plays(plays: Iterable[Dict[str, Any]], limit: int = 20) -> Dict[str, Any]:
     """
     Collapse a month of stored plays into top tracks/artists/albums plus totals.
     """
-    if not plays:
-        return {
-            "play_count": 0,
-            "unique_tracks": 0,
-            "unique_artists": 0,
-            "unique_albums": 0,
-            "total_minutes": 0,
-            "days_active": 0,
-            "top_tracks": [],
-            "top_artists": [],
-            "top_albums": [],
-        }
+    return tally_plays(plays).summary(limit)
 
-    track_counter: Counter = Counter()
-    track_durations: Counter = Counter()
-    track_meta: Dict[str, Dict[str, Any]] = {}
 
-    album_counter: Counter = Counter()
-    album_durations: Counter = Counter()
-    album_meta: Dict[str, Dict[str, Any]] = {}
+def tally_plays(plays: Iterable[Dict[str, Any]]) -> "PlayTally":
+    """
+    Count a batch of plays. Module-level (and the tally plain data) so it can run in a process pool.
+    """
+    tally = PlayTally()
+    for play in plays:
+        tally.add(play)
+    return tally
 
-    artist_counter: Counter = Counter()
-    artist_durations: Counter = Counter()
 
-    days = set()
+def album_key(album: Dict[str, Any], artists: List[str]) -> Optional[str]:
+    """
+    Grouping key for an album: Spotify's ID, else its name plus the first artist, since dump rows
+    only name the album and names like "Greatest Hits" repeat across artists.
+    """
+    if album.get("id"):
+        return album["id"]
+    if not album.get("name"):
+        return None
+    return f"{album['name']}|{artists[0]}" if artists else album["name"]
 
-    for play in plays:
+
+class PlayTally:
+    """
+    Running counts behind summarize_month_from_plays. Everything kept is per distinct track,
+    album, artist or day; for metadata only the last play of each track/album is remembered and
+    its row is built for the top entries alone. Tallies of consecutive batches merge() in order.
+    """
+
+    def __init__(self) -> None:
+        self.plays = 0
+        self.days = set()
+        self.track_counter: Counter = Counter()
+        self.track_durations: Counter = Counter()
+        self.track_last: Dict[str, Dict[str, Any]] = {}
+        self.album_counter: Counter = Counter()
+        self.album_durations: Counter = Counter()
+        self.album_last: Dict[str, Dict[str, Any]] = {}
+        self.artist_counter: Counter = Counter()
+        self.artist_durations: Counter = Counter()
+
+    def add(self, play: Dict[str, Any]) -> None:
+        self.plays += 1
         played_at = play.get("played_at")
         if isinstance(played_at, datetime):
-            days.add(played_at.date())
+            self.days.add(played_at.date())
 
         track = play.get("track") or {}
         track_id = track.get("id") or track.get("name")
         if not track_id:
-            continue
+            return
 
         duration_ms = track.get("duration_ms") or 0
-        track_counter[track_id] += 1
-        track_durations[track_id] += duration_ms
+        self.track_counter[track_id] += 1
+        self.track_durations[track_id] += duration_ms
+        self.track_last[track_id] = track
 
         album = track.get("album") or {}
-        album_id = album.get("id") or album.get("name") or track_id
-        album_counter[album_id] += 1
-        album_durations[album_id] += duration_ms
-
-        track_meta[track_id] = {
-            "name": track.get("name"),
-            "artists": track.get("artists", []),
-            "album": album.get("name"),
-            "image_url": _pick_image_url(album.get("images", [])),
-        }
-        album_meta[album_id] = {
-            "name": album.get("name"),
-            "artists": track.get("artists", []),
-            "image_url": _pick_image_url(album.get("images", [])),
-        }
+        album_id = album_key(album, track.get("artists", [])) or track_id
+        self.album_counter[album_id] += 1
+        self.album_durations[album_id] += duration_ms
+        self.album_last[album_id] = track
 
         for artist in track.get("artists", []):
-            artist_counter[artist] += 1
-            artist_durations[artist] += duration_ms
+            self.artist_counter[artist] += 1
+            self.artist_durations[artist] += duration_ms
+
+    def merge(self, later: "PlayTally") -> None:
+        # Counter.update keeps first-seen order for new keys and dict.update lets the later batch's
+        # last plays win, so merging batch tallies in time order matches one pass over all plays.
+        self.plays += later.plays
+        self.days |= later.days
+        for mine, theirs in (
+            (self.track_counter, later.track_counter),
+            (self.track_durations, later.track_durations),
+            (self.album_counter, later.album_counter),
+            (self.album_durations, later.album_durations),
+            (self.artist_counter, later.artist_counter),
+            (self.artist_durations, later.artist_durations),
+        ):
+            mine.update(theirs)
+        self.track_last.update(later.track_last)
+        self.album_last.update(later.album_last)
+
+    def summary(self, limit: int) -> Dict[str, Any]:
+        if not self.plays:
+            return _empty_month_summary()
+
+        def _track_info(track: Dict[str, Any]) -> Dict[str, Any]:
+            album = track.get("album") or {}
+            return {
+                "name": track.get("name"),
+                "artists": track.get("artists", []),
+                "album": album.get("name"),
+                "image_url": _pick_image_url(album.get("images", [])),
+            }
+
+        def _album_info(track: Dict[str, Any]) -> Dict[str, Any]:
+            album = track.get("album") or {}
+            return {
+                "name": album.get("name"),
+                "artists": track.get("artists", []),
+                "image_url": _pick_image_url(album.get("images", [])),
+            }
+
+        def _list_from(counter: Counter, durations: Counter, info) -> List[Dict[str, Any]]:
+            # most_common(n) is a heapq.nlargest over the distinct keys (ties keep first-seen order),
+            # so only the top `limit` rows are ever ordered or given metadata.
+            return [
+                _ranked_row(key, count, durations.get(key, 0), info(key)) for key, count in counter.most_common(limit)
+            ]
 
-    total_minutes = round(sum(track_durations.values()) / 60000, 2)
+        return {
+            "play_count": sum(self.track_counter.values()),
+            "unique_tracks": len(self.track_counter),
+            "unique_artists": len(self.artist_counter),
+            "unique_albums": len(self.album_counter),
+            "total_minutes": round(sum(self.track_durations.values()) / 60000, 2),
+            "days_active": len(self.days),
+            "top_tracks": _list_from(
+                self.track_counter, self.track_durations, lambda key: _track_info(self.track_last[key])
+            ),
+            "top_artists": _list_from(self.artist_counter, self.artist_durations, lambda key: {"name": key}),
+            "top_albums": _list_from(
+                self.album_counter, self.album_durations, lambda key: _album_info(self.album_last[key])
+            ),
+        }
 
-    def _list_from(counter: Counter, durations: Counter, meta: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
-        rows: List[Dict[str, Any]] = []
-        for key, count in counter.most_common(limit):
-            info = meta.get(key, {})
-            rows.append(
+
+def summarize_month_from_aggregate(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Shape the faceted aggregation from PlaybackStore.summarize_between like summarize_month_from_plays.
+    """
+    totals = (result.get("totals") or [None])[0]
+    if not totals or not totals.get("documents"):
+        return _empty_month_summary()
+
+    def _count(facet: str) -> int:
+        rows = result.get(facet) or []
+        return rows[0]["count"] if rows else 0
+
+    def _list_from(rows: List[Dict[str, Any]], with_meta: bool = True) -> List[Dict[str, Any]]:
+        ranked = []
+        for row in rows:
+            info = (
                 {
-                    "id": key,
-                    "name": info.get("name"),
-                    "artists": info.get("artists", []),
-                    "album": info.get("album"),
-                    "image_url": info.get("image_url"),
-                    "play_count": count,
-                    "minutes": round((durations.get(key, 0) or 0) / 60000, 2),
+                    "name": row.get("name"),
+                    "artists": row.get("artists", []),
+                    "album": row.get("album"),
+                    "image_url": _pick_image_url(row.get("images", [])),
                 }
+                if with_meta
+                else {"name": row["_id"]}
             )
-        return rows
+            ranked.append(_ranked_row(row["_id"], row["play_count"], row.get("duration", 0), info))
+        return ranked
+
+    return {
+        "play_count": totals["play_count"],
+        "unique_tracks": _count("unique_tracks"),
+        "unique_artists": _count("unique_artists"),
+        "unique_albums": _count("unique_albums"),
+        "total_minutes": round((totals.get("duration", 0) or 0) / 60000, 2),
+        "days_active": totals["days_active"],
+        "top_tracks": _list_from(result.get("top_tracks") or []),
+        "top_artists": _list_from(result.get("top_artists") or [], with_meta=False),
+        "top_albums": _list_from(result.get("top_albums") or []),
+    }
+
+
+def _empty_month_summary() -> Dict[str, Any]:
+    return {
+        "play_count": 0,
+        "unique_tracks": 0,
+        "unique_artists": 0,
+        "unique_albums": 0,
+        "total_minutes": 0,
+        "days_active": 0,
+        "top_tracks": [],
+        "top_artists": [],
+        "top_albums": [],
+    }
 
-    artist_meta = {name: {"name": name} for name in artist_counter.keys()}
 
+def _ranked_row(key: str, count: int, duration_ms: int, info: Dict[str, Any]) -> Dict[str, Any]:
     return {
-        "play_count": sum(track_counter.values()),
-        "unique_tracks": len(track_counter),
-        "unique_artists": len(artist_counter),
-        "unique_albums": len(album_counter),
-        "total_minutes": total_minutes,
-        "days_active": len(days),
-        "top_tracks": _list_from(track_counter, track_durations, track_meta),
-        "top_artists": _list_from(artist_counter, artist_durations, artist_meta),
-        "top_albums": _list_from(album_counter, album_durations, album_meta),
+        "id": key,
+        "name": info.get("name"),
+        "artists": info.get("artists", []),
+        "album": info.get("album"),
+        "image_url": info.get("image_url"),
+        "play_count": count,
+        "minutes": round((duration_ms or 0) / 60000, 2),
     }
 
 
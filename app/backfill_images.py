@@ -12,8 +12,15 @@ from app.spotify_client import SpotifyClient
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
 
+TRACKS_PER_REQUEST = 50
 
-async def backfill_images(batch_limit: int = 500) -> None:
+
+async def backfill_images(batch_limit: int = 500, concurrency: int = 4) -> None:
+    """
+    Drain the needs_images queue (batch_limit queue entries per page) until it is empty.
+    Each page fetches /tracks in concurrent 50-ID requests and writes each album's art once,
+    which also takes those tracks off the queue, so an interrupted run resumes where it stopped.
+    """
     settings = get_settings()
     if not settings.mongo_uri:
         raise ValueError("MONGODB_URI is required to backfill images.")
@@ -21,30 +28,41 @@ async def backfill_images(batch_limit: int = 500) -> None:
     store = PlaybackStore.from_settings(settings)
     client = SpotifyClient(settings)
     await store.ensure_indexes()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
 
-    try:
-        missing_ids = await store.track_ids_missing_images(limit=batch_limit)
-        if not missing_ids:
-            logger.info("No tracks missing images.")
-            return
+    async def backfill_chunk(track_ids: List[str]) -> int:
+        async with semaphore:
+            details = await client.get_tracks_details(track_ids)
+        return await store.save_album_artwork(details, checked_track_ids=track_ids)
 
-        logger.info("Found %s track IDs missing images", len(missing_ids))
-        details = await client.get_tracks_details(missing_ids)
+    try:
+        cursor = None
         updated = 0
-        for track_id, track in tqdm(details.items(), desc="Updating images", unit="track"):
-            images: List[dict] = track.get("album", {}).get("images", [])
-            if not images:
-                continue
-            await store.update_album_images(track_id, images)
-            updated += 1
-        logger.info("Updated %s tracks with album images", updated)
+        progress = tqdm(desc="Tracks checked", unit="track")
+        while True:
+            missing_ids = await store.track_ids_missing_images(limit=batch_limit, after=cursor)
+            if not missing_ids:
+                break
+            chunks = [missing_ids[i : i + TRACKS_PER_REQUEST] for i in range(0, len(missing_ids), TRACKS_PER_REQUEST)]
+            updated += sum(await asyncio.gather(*(backfill_chunk(chunk) for chunk in chunks)))
+            progress.update(len(missing_ids))
+            cursor = missing_ids[-1]
+        progress.close()
+
+        if updated:
+            logger.info("Updated %s albums with images", updated)
+        else:
+            logger.info("No tracks missing images.")
     finally:
         await client.close()
         await store.close()
 
 
 if __name__ == "__main__":
-    import sys
+    import argparse
 
-    limit_arg = int(sys.argv[1]) if len(sys.argv) > 1 else 500
-    asyncio.run(backfill_images(batch_limit=limit_arg))
+    parser = argparse.ArgumentParser(description="Fill in album art for stored tracks that are missing it.")
+    parser.add_argument("batch_limit", nargs="?", type=int, default=500, help="Queue entries read per page.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent /tracks requests.")
+    args = parser.parse_args()
+    asyncio.run(backfill_images(batch_limit=args.batch_limit, concurrency=args.concurrency))
@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    etag: Optional[str] = None
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+class TTLCache:
+    """
+    Bounded in-process cache: entries expire after their TTL and the least recently used one is
+    evicted once max_entries is reached. Expired entries are kept (until evicted) so their ETag can
+    be used to revalidate instead of refetching.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._counters = {"hits": 0, "misses": 0, "revalidated": 0, "evictions": 0}
+
+    def lookup(self, key: Hashable) -> Optional[CacheEntry]:
+        """
+        Return the entry for key, fresh or stale. Only fresh entries count as hits.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self._counters["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._counters["hits" if entry.fresh else "misses"] += 1
+        return entry
+
+    def set(self, key: Hashable, value: Any, ttl: float, etag: Optional[str] = None) -> None:
+        self._entries[key] = CacheEntry(value=value, expires_at=time.monotonic() + ttl, etag=etag)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def revalidated(self, key: Hashable, ttl: float) -> None:
+        # A 304 Not Modified: keep the cached body and start a new TTL window.
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.expires_at = time.monotonic() + ttl
+            self._counters["revalidated"] += 1
+
+    def discard(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._counters, "size": len(self._entries)}
@@ -0,0 +1,344 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.analytics import album_key
+
+try:
+    import numpy as np
+except ImportError:  # Optional: only needed with ANALYTICS_ENGINE=columnar.
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshot saves are not serialized between processes.
+    fcntl = None
+
+
+SNAPSHOT_VERSION = 1
+MS_PER_DAY = 86_400_000
+COLUMNS = ("ts", "track", "album", "duration", "artist_offsets", "artist_ids")
+
+
+class ColumnarIndex:
+    """
+    Every stored play as compact columns sorted by time: epoch-ms timestamps, interned track and
+    album IDs (-1 when a play has no track), durations, and artists in CSR form (artist_offsets
+    indexes into artist_ids). Entity keys are interned once; names and artwork stay in the store's
+    dimensions. summarize() answers any [start, end) with a binary search and bincount grouping.
+    Appends (on the event loop) and summaries (possibly in worker threads) may overlap: column
+    arrays are replaced, never modified in place, and folding in pending plays holds a lock.
+    """
+
+    def __init__(self) -> None:
+        if np is None:
+            raise RuntimeError("The columnar analytics engine needs NumPy: pip install numpy")
+        self._track_keys: List[str] = []
+        self._track_named: List[bool] = []  # key is a track name (plays without a Spotify ID)
+        self._album_keys: List[str] = []
+        self._album_is_ref: List[bool] = []  # False when the key fell back to the track key
+        self._artist_keys: List[str] = []
+        self._track_lookup: Dict[str, int] = {}
+        self._album_lookup: Dict[str, int] = {}
+        self._artist_lookup: Dict[str, int] = {}
+        self._columns: Dict[str, Any] = {
+            "ts": np.empty(0, dtype=np.int64),
+            "track": np.empty(0, dtype=np.int32),
+            "album": np.empty(0, dtype=np.int32),
+            "duration": np.empty(0, dtype=np.int64),
+            "artist_offsets": np.zeros(1, dtype=np.int64),
+            "artist_ids": np.empty(0, dtype=np.int32),
+        }
+        # Appended plays wait here until the next read folds them into the columns.
+        self._pending: List[Tuple[int, int, int, int, List[int]]] = []
+        self._lock = threading.Lock()
+        # Plays appended since the last load() or save().
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._columns["ts"]) + len(self._pending)
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def extend(self, plays: Iterable[Dict[str, Any]]) -> None:
+        """
+        Add plays in the store's v1 reference shape ({"played_at", "track": {...}}), in any order.
+        """
+        rows = []
+        for play in plays:
+            track = play.get("track") or {}
+            track_key = track.get("id") or track.get("name")
+            album_ref = track.get("album_key") or album_key(track.get("album") or {}, track.get("artists", []))
+            track_id = album_id = -1
+            if track_key:
+                track_id = _intern(track_key, self._track_lookup, self._track_keys, self._track_named, not track.get("id"))
+                album_id = _intern(
+                    album_ref or track_key, self._album_lookup, self._album_keys, self._album_is_ref, bool(album_ref)
+                )
+            artists = [_intern(name, self._artist_lookup, self._artist_keys) for name in track.get("artists", [])]
+            rows.append((_play_ms(play), track_id, album_id, track.get("duration_ms") or 0, artists))
+        with self._lock:
+            self._pending.extend(rows)
+            self._dirty = self._dirty or bool(rows)
+
+    def extend_unseen(self, plays: Iterable[Dict[str, Any]]) -> int:
+        """
+        extend() without the plays whose played_at is already indexed, for a caller that may meet a
+        play twice (a catch-up scan racing this process's own inserts). Returns plays added.
+        """
+        plays = list(plays)
+        self._flush()
+        ts = self._columns["ts"]
+        if ts.size and plays:
+            stamps = np.array([_play_ms(play) for play in plays], dtype=np.int64)
+            found = ts[np.minimum(np.searchsorted(ts, stamps), ts.size - 1)] == stamps
+            plays = [play for play, seen in zip(plays, found) if not seen]
+        self.extend(plays)
+        return len(plays)
+
+    def newest_ms(self) -> Optional[int]:
+        """
+        Epoch ms of the latest indexed play (pending appends included); None while empty.
+        """
+        self._flush()
+        ts = self._columns["ts"]
+        return int(ts[-1]) if ts.size else None
+
+    def count(self, start_ms: int, end_ms: int) -> int:
+        """
+        Plays in [start_ms, end_ms) among those already folded in (cheap; pending appends are ignored).
+        """
+        first, last = np.searchsorted(self._columns["ts"], [start_ms, end_ms])
+        return int(last - first)
+
+    def summarize(self, start_ms: int, end_ms: int, limit: int = 20) -> Dict[str, Any]:
+        """
+        Plays in [start_ms, end_ms) in the faceted shape PlaybackStore's pipelines return.
+        """
+        self._flush()
+        columns = self._columns
+        first, last = (int(i) for i in np.searchsorted(columns["ts"], [start_ms, end_ms]))
+        if first >= last:
+            return {}
+        ts = columns["ts"][first:last]
+        track = columns["track"][first:last]
+        album = columns["album"][first:last]
+        duration = columns["duration"][first:last]
+
+        played = np.flatnonzero(track >= 0)
+        offsets = columns["artist_offsets"][first : last + 1]
+        entry_play = np.repeat(np.arange(last - first), np.diff(offsets))
+        entry_artist = columns["artist_ids"][offsets[0] : offsets[-1]]
+        counted = track[entry_play] >= 0
+        entry_play, entry_artist = entry_play[counted], entry_artist[counted]
+
+        def artists_of(position: int) -> List[str]:
+            return [self._artist_keys[i] for i in columns["artist_ids"][offsets[position] : offsets[position + 1]]]
+
+        unique_tracks, top_tracks = _rank(track[played], duration[played], played, limit)
+        unique_albums, top_albums = _rank(album[played], duration[played], played, limit)
+        unique_artists, top_artists = _rank(entry_artist, duration[entry_play], entry_play, limit)
+
+        def album_ref(position: int) -> Optional[str]:
+            album_id = int(album[position])
+            return self._album_keys[album_id] if self._album_is_ref[album_id] else None
+
+        return {
+            "totals": [
+                {
+                    "documents": last - first,
+                    "play_count": int(played.size),
+                    "duration": int(duration[played].sum()),
+                    "days_active": int(np.unique(ts // MS_PER_DAY).size),
+                }
+            ],
+            "unique_tracks": [{"count": unique_tracks}],
+            "unique_albums": [{"count": unique_albums}],
+            "unique_artists": [{"count": unique_artists}],
+            "top_tracks": [
+                {
+                    "_id": self._track_keys[key],
+                    "play_count": count,
+                    "duration": total,
+                    "name": self._track_keys[key] if self._track_named[key] else None,
+                    "artists": artists_of(position),
+                    "album_ref": album_ref(position),
+                }
+                for key, count, total, position in top_tracks
+            ],
+            "top_albums": [
+                {
+                    "_id": self._album_keys[key],
+                    "play_count": count,
+                    "duration": total,
+                    "artists": artists_of(position),
+                    "album_ref": album_ref(position),
+                    "track_key": self._track_keys[int(track[position])],
+                }
+                for key, count, total, position in top_albums
+            ],
+            "top_artists": [
+                {"_id": self._artist_keys[key], "play_count": count, "duration": total}
+                for key, count, total, _ in top_artists
+            ],
+        }
+
+    def save(self, path: str) -> None:
+        """
+        Write the columns as .npy files (memory-mappable) plus the interned keys, then swap the
+        manifest in atomically so a crash mid-save leaves the previous snapshot usable. Several
+        workers may share path: saves hold an exclusive lock file, and the generation the manifest
+        named before is kept for readers that are still opening it; older ones are removed.
+        """
+        with self._lock:
+            self._flush_locked()
+            columns, plays = self._columns, len(self._columns["ts"])
+            self._dirty = False
+        entities = {
+            "tracks": list(self._track_keys),
+            "track_named": list(self._track_named),
+            "albums": list(self._album_keys),
+            "album_is_ref": list(self._album_is_ref),
+            "artists": list(self._artist_keys),
+        }
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "save.lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            generation = str(time.time_ns())
+            for name in COLUMNS:
+                np.save(os.path.join(path, f"{name}.{generation}.npy"), np.asarray(columns[name]))
+            with open(os.path.join(path, f"entities.{generation}.json"), "w", encoding="utf-8") as fp:
+                json.dump(entities, fp)
+            manifest = os.path.join(path, "manifest.json")
+            previous = _read_manifest(path).get("generation", generation)
+            with open(manifest + ".tmp", "w", encoding="utf-8") as fp:
+                json.dump({"version": SNAPSHOT_VERSION, "generation": generation, "plays": plays}, fp)
+            os.replace(manifest + ".tmp", manifest)
+            for filename in os.listdir(path):
+                parts = filename.split(".")
+                if len(parts) == 3 and parts[1] not in (generation, previous) and parts[2] in ("npy", "json"):
+                    os.remove(os.path.join(path, filename))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ColumnarIndex"]:
+        """
+        Map a snapshot written by save() back in; None when there is no usable snapshot at path
+        (missing, from another version, or any file missing or corrupt), so the caller rebuilds.
+        """
+        manifest = _read_manifest(path)
+        if manifest.get("version") != SNAPSHOT_VERSION:
+            return None
+        index = cls()
+        try:
+            generation = manifest["generation"]
+            for name in COLUMNS:
+                index._columns[name] = np.load(os.path.join(path, f"{name}.{generation}.npy"), mmap_mode="r")
+            with open(os.path.join(path, f"entities.{generation}.json"), encoding="utf-8") as fp:
+                entities = json.load(fp)
+            index._track_keys, index._track_named = entities["tracks"], entities["track_named"]
+            index._album_keys, index._album_is_ref = entities["albums"], entities["album_is_ref"]
+            index._artist_keys = entities["artists"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        columns = index._columns
+        if len(columns["ts"]) != manifest.get("plays") or len(columns["artist_offsets"]) != len(columns["ts"]) + 1:
+            return None
+        index._track_lookup = {key: i for i, key in enumerate(index._track_keys)}
+        index._album_lookup = {key: i for i, key in enumerate(index._album_keys)}
+        index._artist_lookup = {key: i for i, key in enumerate(index._artist_keys)}
+        return index
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        columns = self._columns
+        counts = np.array([len(row[4]) for row in pending], dtype=np.int64)
+        ts = np.concatenate([columns["ts"], np.array([row[0] for row in pending], dtype=np.int64)])
+        track = np.concatenate([columns["track"], np.array([row[1] for row in pending], dtype=np.int32)])
+        album = np.concatenate([columns["album"], np.array([row[2] for row in pending], dtype=np.int32)])
+        duration = np.concatenate([columns["duration"], np.array([row[3] for row in pending], dtype=np.int64)])
+        offsets = np.concatenate([columns["artist_offsets"], columns["artist_offsets"][-1] + np.cumsum(counts)])
+        artist_ids = np.concatenate(
+            [columns["artist_ids"], np.array([i for row in pending for i in row[4]], dtype=np.int32)]
+        )
+        if ts.size > 1 and np.any(ts[1:] < ts[:-1]):
+            # Out-of-order appends (dump imports): restore time order, carrying the artist segments along.
+            order = np.argsort(ts, kind="stable")
+            lengths = np.diff(offsets)[order]
+            starts = offsets[:-1][order]
+            new_offsets = np.concatenate([[0], np.cumsum(lengths)])
+            gather = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+            ts, track, album, duration = ts[order], track[order], album[order], duration[order]
+            artist_ids, offsets = artist_ids[gather], new_offsets
+        self._columns = {
+            "ts": ts,
+            "track": track,
+            "album": album,
+            "duration": duration,
+            "artist_offsets": offsets,
+            "artist_ids": artist_ids,
+        }
+
+
+def _play_ms(play: Dict[str, Any]) -> int:
+    played_at: datetime = play["played_at"]
+    if played_at.tzinfo is None:
+        played_at = played_at.replace(tzinfo=timezone.utc)
+    return int(played_at.timestamp() * 1000)
+
+
+def _read_manifest(path: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as fp:
+            manifest = json.load(fp)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def _intern(key: str, lookup: Dict[str, int], keys: List[str], flags: Optional[List[bool]] = None, flag: bool = False) -> int:
+    index = lookup.get(key)
+    if index is None:
+        index = lookup[key] = len(keys)
+        keys.append(key)
+        if flags is not None:
+            flags.append(flag)
+    return index
+
+
+def _rank(groups: Any, weights: Any, positions: Any, limit: int) -> Tuple[int, List[Tuple[int, int, int, int]]]:
+    """
+    Distinct groups and the top `limit` as (group, count, weight sum, position of its last play),
+    ordered by count desc then first appearance, like Counter.most_common over plays in time order.
+    Linear passes only (bincount and ufunc.at), no sort of the plays themselves.
+    """
+    if not groups.size:
+        return 0, []
+    counts = np.bincount(groups)
+    sums = np.bincount(groups, weights=weights)
+    order = np.arange(groups.size)
+    first = np.full(counts.size, groups.size)
+    np.minimum.at(first, groups, order)
+    last = np.zeros(counts.size, dtype=order.dtype)
+    np.maximum.at(last, groups, order)
+    present = np.flatnonzero(counts)
+    candidates = present
+    if present.size > limit:
+        # Partial selection first: only groups tied with or above the limit-th count need sorting.
+        threshold = np.partition(counts[present], present.size - limit)[present.size - limit]
+        candidates = present[counts[present] >= threshold]
+    top = candidates[np.lexsort((first[candidates], -counts[candidates]))[:limit]]
+    return int(present.size), [
+        (int(key), int(counts[key]), int(round(sums[key])), int(positions[last[key]])) for key in top
+    ]
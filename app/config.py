@@ -16,9 +16,43 @@ class Settings:
     api_base: str = "https://api.spotify.com/v1"
     auth_base: str = "https://accounts.spotify.com/api"
     request_timeout: int = 15
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry: float = 30.0
+    http2: bool = False
+    spotify_page_concurrency: int = 4
+    spotify_rate_limit: float = 10.0
+    spotify_rate_burst: int = 20
+    spotify_max_concurrency: int = 8
+    spotify_max_retries: int = 3
+    spotify_retry_backoff: float = 0.5
+    spotify_max_retry_wait: float = 30.0
+    spotify_cache_max_entries: int = 256
+    spotify_cache_ttl_profile: float = 3600.0
+    spotify_cache_ttl_top: float = 1800.0
     mongo_uri: str = ""
     mongo_db: str = "rewrapped"
     mongo_collection: str = "plays"
+    mongo_state_collection: str = "ingest_state"
+    mongo_tracks_collection: str = "tracks"
+    mongo_albums_collection: str = "albums"
+    mongo_rollups_collection: str = "rollups"
+    mongo_dimension_cache_size: int = 10000
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_server_selection_timeout_ms: int = 10000
+    mongo_connect_timeout_ms: int = 10000
+    mongo_socket_timeout_ms: int = 30000
+    analytics_engine: str = "mongo"
+    columnar_snapshot_path: str = ""
+    analytics_executor: str = "thread"
+    analytics_workers: int = 2
+    analytics_offload_threshold: int = 5000
+    loop_lag_interval: float = 0.5
+    ingest_scheduler_enabled: bool = False
+    ingest_min_interval: float = 60.0
+    ingest_max_interval: float = 900.0
+    ingest_target_fill: float = 0.5
 
     @classmethod
     def from_env(cls) -> "Settings":
@@ -33,12 +67,57 @@ class Settings:
             api_base=os.getenv("SPOTIFY_API_BASE", cls.api_base),
             auth_base=os.getenv("SPOTIFY_AUTH_BASE", cls.auth_base),
             request_timeout=int(os.getenv("REQUEST_TIMEOUT", cls.request_timeout)),
+            http_max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", cls.http_max_connections)),
+            http_max_keepalive_connections=int(
+                os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", cls.http_max_keepalive_connections)
+            ),
+            http_keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", cls.http_keepalive_expiry)),
+            http2=_env_flag("HTTP2", cls.http2),
+            spotify_page_concurrency=int(os.getenv("SPOTIFY_PAGE_CONCURRENCY", cls.spotify_page_concurrency)),
+            spotify_rate_limit=float(os.getenv("SPOTIFY_RATE_LIMIT", cls.spotify_rate_limit)),
+            spotify_rate_burst=int(os.getenv("SPOTIFY_RATE_BURST", cls.spotify_rate_burst)),
+            spotify_max_concurrency=int(os.getenv("SPOTIFY_MAX_CONCURRENCY", cls.spotify_max_concurrency)),
+            spotify_max_retries=int(os.getenv("SPOTIFY_MAX_RETRIES", cls.spotify_max_retries)),
+            spotify_retry_backoff=float(os.getenv("SPOTIFY_RETRY_BACKOFF", cls.spotify_retry_backoff)),
+            spotify_max_retry_wait=float(os.getenv("SPOTIFY_MAX_RETRY_WAIT", cls.spotify_max_retry_wait)),
+            spotify_cache_max_entries=int(os.getenv("SPOTIFY_CACHE_MAX_ENTRIES", cls.spotify_cache_max_entries)),
+            spotify_cache_ttl_profile=float(os.getenv("SPOTIFY_CACHE_TTL_PROFILE", cls.spotify_cache_ttl_profile)),
+            spotify_cache_ttl_top=float(os.getenv("SPOTIFY_CACHE_TTL_TOP", cls.spotify_cache_ttl_top)),
             mongo_uri=os.getenv("MONGODB_URI", ""),
             mongo_db=os.getenv("MONGODB_DB", cls.mongo_db),
             mongo_collection=os.getenv("MONGODB_COLLECTION", cls.mongo_collection),
+            mongo_state_collection=os.getenv("MONGODB_STATE_COLLECTION", cls.mongo_state_collection),
+            mongo_tracks_collection=os.getenv("MONGODB_TRACKS_COLLECTION", cls.mongo_tracks_collection),
+            mongo_albums_collection=os.getenv("MONGODB_ALBUMS_COLLECTION", cls.mongo_albums_collection),
+            mongo_rollups_collection=os.getenv("MONGODB_ROLLUPS_COLLECTION", cls.mongo_rollups_collection),
+            mongo_dimension_cache_size=int(os.getenv("MONGODB_DIMENSION_CACHE_SIZE", cls.mongo_dimension_cache_size)),
+            mongo_max_pool_size=int(os.getenv("MONGODB_MAX_POOL_SIZE", cls.mongo_max_pool_size)),
+            mongo_min_pool_size=int(os.getenv("MONGODB_MIN_POOL_SIZE", cls.mongo_min_pool_size)),
+            mongo_server_selection_timeout_ms=int(
+                os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", cls.mongo_server_selection_timeout_ms)
+            ),
+            mongo_connect_timeout_ms=int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", cls.mongo_connect_timeout_ms)),
+            mongo_socket_timeout_ms=int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", cls.mongo_socket_timeout_ms)),
+            analytics_engine=os.getenv("ANALYTICS_ENGINE", cls.analytics_engine).strip().lower(),
+            columnar_snapshot_path=os.getenv("COLUMNAR_SNAPSHOT_PATH", cls.columnar_snapshot_path),
+            analytics_executor=os.getenv("ANALYTICS_EXECUTOR", cls.analytics_executor).strip().lower(),
+            analytics_workers=int(os.getenv("ANALYTICS_WORKERS", cls.analytics_workers)),
+            analytics_offload_threshold=int(os.getenv("ANALYTICS_OFFLOAD_THRESHOLD", cls.analytics_offload_threshold)),
+            loop_lag_interval=float(os.getenv("EVENT_LOOP_LAG_INTERVAL", cls.loop_lag_interval)),
+            ingest_scheduler_enabled=_env_flag("INGEST_SCHEDULER_ENABLED", cls.ingest_scheduler_enabled),
+            ingest_min_interval=float(os.getenv("INGEST_MIN_INTERVAL", cls.ingest_min_interval)),
+            ingest_max_interval=float(os.getenv("INGEST_MAX_INTERVAL", cls.ingest_max_interval)),
+            ingest_target_fill=float(os.getenv("INGEST_TARGET_FILL", cls.ingest_target_fill)),
         )
 
 
+def _env_flag(key: str, default: bool) -> bool:
+    value = os.getenv(key)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
     return Settings.from_env()
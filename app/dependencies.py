@@ -1,22 +1,17 @@
-from typing import AsyncGenerator
+from fastapi import HTTPException, Request
 
-from app.config import get_settings
 from app.playback_store import PlaybackStore
 from app.spotify_client import SpotifyClient
 
 
-async def get_spotify_client() -> AsyncGenerator[SpotifyClient, None]:
-    client = SpotifyClient(get_settings())
-    try:
-        yield client
-    finally:
-        await client.close()
+async def get_spotify_client(request: Request) -> SpotifyClient:
+    # Shared for the app lifetime so the connection pool and access token are reused across requests.
+    return request.app.state.spotify_client
 
 
-async def get_playback_store() -> AsyncGenerator[PlaybackStore, None]:
-    store = PlaybackStore.from_settings(get_settings())
-    await store.ensure_indexes()
-    try:
-        yield store
-    finally:
-        await store.close()
+async def get_playback_store(request: Request) -> PlaybackStore:
+    # Created once in the app lifespan (see app.main) so requests share one pooled client.
+    store = request.app.state.playback_store
+    if store is None:
+        raise HTTPException(status_code=500, detail="MONGODB_URI is required to use the playback store.")
+    return store
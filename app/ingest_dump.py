@@ -1,11 +1,15 @@
-import asyncio, json, glob
-from datetime import datetime, timezone
-from pathlib import Path
+import asyncio, fnmatch, io, json, glob, hashlib, multiprocessing, os, time, zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, List, Optional, Tuple
 
 from tqdm import tqdm
 
 from app.config import get_settings
-from app.playback_store import PlaybackStore, _coerce_utc_datetime
+from app.playback_store import PlaybackStore, coerce_utc_datetime
+
+DEFAULT_MEMBER_GLOB = "Streaming_History_Audio*.json"
 
 def normalize(row):
     # drop podcasts/episodes
@@ -17,7 +21,7 @@ def normalize(row):
     if "ts" in row:
         uri = row.get("spotify_track_uri") or ""
         _id = uri.split(":")[-1] if uri else None
-        played_dt = _coerce_utc_datetime(row["ts"])
+        played_dt = coerce_utc_datetime(row["ts"])
         track_name = row.get("master_metadata_track_name")
         artist = row.get("master_metadata_album_artist_name")
         album = row.get("master_metadata_album_album_name")
@@ -37,38 +41,318 @@ def normalize(row):
         "context": {"source": "history_dump"},
     }
 
-async def ingest_dump(path_glob: str, batch_size: int = 500):
+def iter_json_array(fp, chunk_size: int = 1 << 16):
+    """
+    Yield the elements of a top-level JSON array one by one, reading fp in fixed-size chunks
+    so memory stays flat no matter how large the export file is.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+        # Drop what was already consumed so the buffer never holds more than ~one chunk plus a row.
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos:pos + 1]
+            fill()
+
+    if peek() != "[":
+        raise ValueError("Expected a JSON array at the top level of the history file.")
+    pos += 1
+    if peek() == "]":
+        return
+    while True:
+        peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # A scalar cut at the chunk edge (e.g. "-1" of "-1.5") parses fine but is incomplete.
+            if not eof and (end == len(buffer) or buffer[end] not in ",] \t\r\n"):
+                fill()
+                continue
+            break
+        pos = end
+        yield value
+        separator = peek()
+        if separator == ",":
+            pos += 1
+        elif separator == "]":
+            return
+        else:
+            raise ValueError(f"Malformed JSON array: unexpected {separator!r} after element.")
+
+
+def _discover_sources(path_glob: str, member_glob: str) -> List[Tuple[str, Optional[str]]]:
+    """
+    Expand path_glob into (path, member) sources. Plain files have member None; ZIP archives (e.g. the
+    my_spotify_data.zip Spotify sends) contribute every member whose file name matches member_glob.
+    """
+    sources: List[Tuple[str, Optional[str]]] = []
+    for path in sorted(glob.glob(path_glob)):
+        if not zipfile.is_zipfile(path):
+            sources.append((path, None))
+            continue
+        with zipfile.ZipFile(path) as archive:
+            members = [
+                info.filename
+                for info in archive.infolist()
+                if not info.is_dir() and fnmatch.fnmatch(PurePosixPath(info.filename).name, member_glob)
+            ]
+        sources.extend((path, member) for member in sorted(members))
+    return sources
+
+
+@contextmanager
+def _open_source(path: str, member: Optional[str], binary: bool = False):
+    # Archive members are decompressed as a stream; nothing is extracted to disk.
+    if member is None:
+        with open(path, "rb") if binary else open(path, "r", encoding="utf-8") as f:
+            yield f
+        return
+    with zipfile.ZipFile(path) as archive, archive.open(member) as raw:
+        yield raw if binary else io.TextIOWrapper(raw, encoding="utf-8")
+
+
+def _source_name(path: str, member: Optional[str]) -> str:
+    return f"{Path(path).name}:{PurePosixPath(member).name}" if member else Path(path).name
+
+
+def _fingerprint(path: str, member: Optional[str]) -> Dict[str, Any]:
+    # Cheap identity for a file already imported: an unchanged path, size and mtime skip the hash.
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "member": member, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _fingerprint_id(fingerprint: Dict[str, Any]) -> Tuple[Any, ...]:
+    return tuple(fingerprint.get(field) for field in ("path", "member", "size", "mtime_ns"))
+
+
+def _hash_file(path: str, member: Optional[str] = None, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with _open_source(path, member, binary=True) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _parse_file(path: str, member: Optional[str], key: str, start_row: int, batch_size: int, queue) -> int:
+    """
+    Process-pool worker: stream one history file (or archive member), normalize its rows and push batches onto the
+    shared (bounded) queue as (key, first_row, end_row, items, final). Rows before start_row were
+    committed by an earlier run and are only counted. Returns the number of raw rows in the file.
+    """
+    rows = 0
+    batch = []
+    batch_start = start_row
+    with _open_source(path, member) as f:
+        for row in iter_json_array(f):
+            rows += 1
+            if rows <= start_row:
+                continue
+            item = normalize(row)
+            if item:
+                batch.append(item)
+            if len(batch) >= batch_size:
+                queue.put((key, batch_start, rows, batch, False))
+                batch = []
+                batch_start = rows
+    # Always close the file out, even with nothing left to write, so it can be marked complete.
+    queue.put((key, batch_start, rows, batch, True))
+    return rows
+
+
+class _Checkpoints:
+    """
+    Per-file resume points. Writers commit row ranges out of order; only the contiguous prefix of
+    committed rows is persisted, so a crash never skips rows that were not written.
+    """
+
+    def __init__(
+        self,
+        store: PlaybackStore,
+        sources: Dict[str, str],
+        committed: Dict[str, int],
+        fingerprints: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> None:
+        self._store = store
+        self._sources = sources
+        self._fingerprints = fingerprints or {}
+        self._committed = dict(committed)
+        self._pending: Dict[str, Dict[int, int]] = {key: {} for key in sources}
+        self._totals: Dict[str, int] = {}
+
+    async def commit(self, key: str, start: int, end: int, final: bool) -> None:
+        pending = self._pending[key]
+        pending[start] = end
+        if final:
+            self._totals[key] = end
+        advanced = False
+        while self._committed[key] in pending:
+            self._committed[key] = pending.pop(self._committed[key])
+            advanced = True
+        if advanced:
+            completed = self._committed[key] == self._totals.get(key)
+            await self._store.save_import_checkpoint(
+                key, self._sources[key], self._committed[key], completed, fingerprint=self._fingerprints.get(key)
+            )
+
+
+async def ingest_dump(
+    path_glob: str,
+    batch_size: int = 500,
+    member_glob: str = DEFAULT_MEMBER_GLOB,
+    parse_workers: Optional[int] = None,
+    writers: int = 4,
+    queue_size: int = 16,
+):
+    """
+    Producer/consumer import: files are parsed and normalized in a process pool, batches flow through
+    a bounded queue, and several concurrent bulk writers drain it so parsing and Mongo writes overlap.
+    Progress is checkpointed per file content hash, so reruns skip finished files and resume partial ones.
+    path_glob may also point at the ZIP export itself, in which case member_glob selects the history files.
+    """
     settings = get_settings()
     store = PlaybackStore.from_settings(settings)
     await store.ensure_indexes()
 
-    inserted = skipped = 0
+    files = _discover_sources(path_glob, member_glob)
+    if not files:
+        print(f"No history files matched {path_glob!r}.")
+        await store.close()
+        return
+
+    parse_workers = parse_workers or min(len(files), os.cpu_count() or 1)
+    loop = asyncio.get_running_loop()
+    totals = {"inserted": 0, "skipped": 0}
+    batches: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    started = time.perf_counter()
+
+    async def pump(mp_queue) -> None:
+        # Bridge the cross-process queue onto the event loop without blocking it.
+        while True:
+            message = await loop.run_in_executor(None, mp_queue.get)
+            if message is None:
+                return
+            await batches.put(message)
+
+    async def write() -> None:
+        while True:
+            message = await batches.get()
+            if message is None:
+                return
+            key, start, end, items, final = message
+            counts = await store.save_recently_played(items)
+            totals["inserted"] += counts["inserted"]
+            totals["skipped"] += counts["skipped"]
+            await checkpoints.commit(key, start, end, final)
+            progress.update(end - start)
+
     try:
-        files = [Path(p) for p in glob.glob(path_glob)]
-        for file_path in tqdm(files, desc="Files", unit="file"):
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            batch = []
-            for row in tqdm(data, desc=file_path.name, unit="row"):
-                item = normalize(row)
-                if not item:
-                    continue
-                batch.append(item)
-                if len(batch) >= batch_size:
-                    counts = await store.save_recently_played(batch)
-                    inserted += counts["inserted"]
-                    skipped += counts["skipped"]
-                    batch.clear()
-            if batch:
-                counts = await store.save_recently_played(batch)
-                inserted += counts["inserted"]
-                skipped += counts["skipped"]
-
-        print(f"Done. Inserted: {inserted}, skipped (already present): {skipped}")
+        # Spawned, not forked (as in app.offload): Motor's threads are already running by now.
+        context = multiprocessing.get_context("spawn")
+        # The pool wraps the manager so that on failure the queue goes away first and any parser
+        # blocked on a full queue errors out instead of holding the pool open.
+        with ProcessPoolExecutor(max_workers=parse_workers, mp_context=context) as pool, context.Manager() as manager:
+            # Files seen before with the same path, size and mtime keep their key; only the rest are hashed.
+            fingerprints = {source: _fingerprint(*source) for source in files}
+            known = await store.find_import_checkpoints(list(fingerprints.values()))
+            known_keys = {_fingerprint_id(doc["fingerprint"]): key for key, doc in known.items()}
+            unknown = [source for source in files if _fingerprint_id(fingerprints[source]) not in known_keys]
+            hashes = await asyncio.gather(*(loop.run_in_executor(pool, _hash_file, *source) for source in unknown))
+            digests = dict(zip(unknown, hashes))
+            keys = {
+                known_keys.get(_fingerprint_id(fingerprints[source])) or f"dump:{digests[source]}": source for source in files
+            }
+            saved = await store.get_import_checkpoints(list(keys))
+            for key, source in keys.items():
+                if source in digests and saved.get(key, {}).get("completed"):
+                    # Finished before fingerprints were recorded (or since moved/touched): record it now.
+                    await store.save_import_checkpoint(
+                        key, _source_name(*source), saved[key]["rows_committed"], True, fingerprint=fingerprints[source]
+                    )
+            todo = {key: source for key, source in keys.items() if not saved.get(key, {}).get("completed")}
+            resume_from = {key: saved.get(key, {}).get("rows_committed", 0) for key in todo}
+            checkpoints = _Checkpoints(
+                store,
+                {key: _source_name(*source) for key, source in todo.items()},
+                resume_from,
+                {key: fingerprints[source] for key, source in todo.items()},
+            )
+            if len(todo) < len(keys):
+                print(f"Skipping {len(keys) - len(todo)} already imported file(s).")
+            progress = tqdm(desc="Rows", unit="row", initial=sum(resume_from.values()))
+
+            mp_queue = manager.Queue(maxsize=queue_size)
+            parsers = [
+                loop.run_in_executor(pool, _parse_file, *source, key, resume_from[key], batch_size, mp_queue)
+                for key, source in todo.items()
+            ]
+
+            async def produce() -> int:
+                rows = sum(await asyncio.gather(*parsers))
+                await loop.run_in_executor(None, mp_queue.put, None)
+                await pump_task
+                for _ in writer_tasks:
+                    await batches.put(None)
+                return rows
+
+            pump_task = asyncio.create_task(pump(mp_queue))
+            writer_tasks = [asyncio.create_task(write()) for _ in range(max(1, writers))]
+            producer = asyncio.create_task(produce())
+            try:
+                rows_read, *_ = await asyncio.gather(producer, *writer_tasks)
+            except BaseException:
+                for task in (producer, pump_task, *writer_tasks):
+                    task.cancel()
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        progress.close()
+        elapsed = time.perf_counter() - started
+        written = totals["inserted"] + totals["skipped"]
+        print(
+            f"Done. Inserted: {totals['inserted']}, skipped (already present): {totals['skipped']}. "
+            f"Read {rows_read} rows from {len(todo)} of {len(files)} files in {elapsed:.1f}s "
+            f"({rows_read / elapsed:.0f} rows/sec read, {written / elapsed:.0f} rows/sec written)."
+        )
     finally:
         await store.close()
 
+
 if __name__ == "__main__":
-    import sys
-    glob_arg = sys.argv[1] if len(sys.argv) > 1 else "Streaming_History_Audio*.json"
-    asyncio.run(ingest_dump(glob_arg))
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import Spotify extended streaming history files into MongoDB.")
+    parser.add_argument("path_glob", nargs="?", default=DEFAULT_MEMBER_GLOB, help="History files or the export ZIP.")
+    parser.add_argument("member_glob", nargs="?", default=DEFAULT_MEMBER_GLOB, help="Member filter inside ZIP archives.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Plays per bulk write.")
+    parser.add_argument("--parse-workers", type=int, default=None, help="Parser processes (default: one per file, up to CPU count).")
+    parser.add_argument("--writers", type=int, default=4, help="Concurrent bulk writers.")
+    parser.add_argument("--queue-size", type=int, default=16, help="Normalized batches buffered between parsers and writers.")
+    args = parser.parse_args()
+    asyncio.run(
+        ingest_dump(
+            args.path_glob,
+            batch_size=args.batch_size,
+            member_glob=args.member_glob,
+            parse_workers=args.parse_workers,
+            writers=args.writers,
+            queue_size=args.queue_size,
+        )
+    )
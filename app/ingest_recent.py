@@ -1,14 +1,51 @@
 import asyncio
 import logging
+from typing import Any, Dict
 
 from app.config import get_settings
-from app.playback_store import PlaybackStore
+from app.playback_store import PlaybackStore, coerce_utc_datetime
 from app.spotify_client import SpotifyClient
 
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
 
+RECENT_PAGE_SIZE = 50
+
+
+async def ingest_recent_plays(client: SpotifyClient, store: PlaybackStore) -> Dict[str, Any]:
+    """
+    One poll of recently played using caller-owned client and store. Returns what happened so
+    long-running callers (see app.ingest_scheduler) can adapt.
+    """
+    # Only ask for plays newer than the last one we stored instead of re-sending the whole window.
+    high_water = await store.get_recent_high_water()
+    after_ms = int(high_water.timestamp() * 1000) if high_water else None
+    recent = await client.get_recently_played(max_items=RECENT_PAGE_SIZE, after_ms=after_ms)
+    logger.info("Fetched %s recent plays from Spotify after %s", len(recent), high_water or "the beginning")
+    overflow = bool(high_water) and len(recent) >= RECENT_PAGE_SIZE
+    if overflow:
+        logger.warning(
+            "Spotify returned a full page of %s plays since %s; plays between polls may have been lost. "
+            "Poll more often to close the gap.",
+            len(recent),
+            high_water.isoformat(),
+        )
+
+    counts = {"inserted": 0, "skipped": 0}
+    newest = max((coerce_utc_datetime(item["played_at"]) for item in recent if item.get("played_at")), default=None)
+    if recent:
+        counts = await store.save_recently_played(recent)
+        logger.info("Stored recent plays - inserted: %s, skipped (already present): %s", counts["inserted"], counts["skipped"])
+    if newest:
+        await store.save_recent_high_water(newest)
+
+    return {
+        "fetched": len(recent),
+        **counts,
+        "overflow": overflow,
+        "newest_played_at": max(filter(None, (newest, high_water)), default=None),
+    }
+
 
 async def ingest_once() -> None:
     settings = get_settings()
@@ -20,14 +57,12 @@ async def ingest_once() -> None:
     await store.ensure_indexes()
 
     try:
-        recent = await client.get_recently_played(max_items=50)
-        logger.info("Fetched %s recent plays from Spotify", len(recent))
-        counts = await store.save_recently_played(recent)
-        logger.info("Stored recent plays - inserted: %s, skipped (already present): %s", counts["inserted"], counts["skipped"])
+        await ingest_recent_plays(client, store)
     finally:
         await client.close()
         await store.close()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
     asyncio.run(ingest_once())
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from app.config import Settings, get_settings
+from app.ingest_recent import RECENT_PAGE_SIZE, ingest_recent_plays
+from app.playback_store import PlaybackStore
+from app.spotify_client import SpotifyClient
+
+
+logger = logging.getLogger(__name__)
+
+
+class IngestScheduler:
+    """
+    Background recently-played poller that reuses an existing SpotifyClient and PlaybackStore.
+    The interval follows the observed play rate: it aims to see about target_fill of Spotify's
+    50-play window per poll, staying between min_interval and max_interval seconds.
+    """
+
+    def __init__(
+        self,
+        client: SpotifyClient,
+        store: PlaybackStore,
+        min_interval: float = 60,
+        max_interval: float = 900,
+        target_fill: float = 0.5,
+    ) -> None:
+        self._client = client
+        self._store = store
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.target_fill = target_fill
+        self.interval = min_interval
+        self._plays_per_second: Optional[float] = None
+        self._last_poll: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        # Heartbeat key: rebuild_rollups refuses to run while any scheduler's heartbeat is fresh.
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._status: Dict[str, Any] = {
+            "runs": 0,
+            "failures": 0,
+            "last_run_at": None,
+            "last_success_at": None,
+            "last_result": None,
+            "last_error": None,
+            "newest_played_at": None,
+            "next_run_at": None,
+        }
+
+    @classmethod
+    def from_settings(cls, settings: Settings, client: SpotifyClient, store: PlaybackStore) -> "IngestScheduler":
+        return cls(
+            client,
+            store,
+            min_interval=settings.ingest_min_interval,
+            max_interval=settings.ingest_max_interval,
+            target_fill=settings.ingest_target_fill,
+        )
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self._store.clear_ingest_heartbeat(self.name)
+        except Exception:
+            logger.warning("Could not clear the ingestion heartbeat", exc_info=True)
+
+    async def _run(self) -> None:
+        while True:
+            await self.run_once()
+            self._status["next_run_at"] = datetime.fromtimestamp(time.time() + self.interval, timezone.utc)
+            try:
+                await self._store.save_ingest_heartbeat(self.name, self._status["next_run_at"])
+            except Exception:  # the next poll reports the outage; the loop must not die over it
+                logger.warning("Could not record the ingestion heartbeat", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> None:
+        started = time.monotonic()
+        self._status["runs"] += 1
+        self._status["last_run_at"] = datetime.now(timezone.utc)
+        try:
+            result = await ingest_recent_plays(self._client, self._store)
+        except Exception as exc:  # keep the loop alive; the next poll retries
+            logger.exception("Scheduled ingestion failed")
+            self._status["failures"] += 1
+            self._status["last_error"] = repr(exc)
+            self.interval = min(self.max_interval, max(self.min_interval, self.interval * 2))
+            return
+
+        self._status.update(
+            last_success_at=self._status["last_run_at"],
+            last_result=result,
+            last_error=None,
+            newest_played_at=result["newest_played_at"],
+        )
+        self._adapt(result, started)
+
+    def _adapt(self, result: Dict[str, Any], polled_at: float) -> None:
+        if self._last_poll is not None:
+            elapsed = max(polled_at - self._last_poll, 1.0)
+            observed = result["fetched"] / elapsed
+            # Exponentially weighted so one binge (or one quiet night) does not swing the interval.
+            self._plays_per_second = (
+                observed if self._plays_per_second is None else 0.3 * observed + 0.7 * self._plays_per_second
+            )
+        self._last_poll = polled_at
+
+        if result["overflow"]:
+            self.interval = self.min_interval
+        elif self._plays_per_second == 0:
+            self.interval = self.max_interval
+        elif self._plays_per_second is not None:
+            target = self.target_fill * RECENT_PAGE_SIZE / self._plays_per_second
+            self.interval = min(self.max_interval, max(self.min_interval, target))
+
+    def status(self) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        newest = self._status["newest_played_at"]
+        last_success = self._status["last_success_at"]
+        return {
+            **self._status,
+            "running": self._task is not None and not self._task.done(),
+            "interval_seconds": round(self.interval, 1),
+            "plays_per_hour": round(self._plays_per_second * 3600, 2) if self._plays_per_second is not None else None,
+            "lag_seconds": round((now - newest).total_seconds(), 1) if newest else None,
+            "seconds_since_success": round((now - last_success).total_seconds(), 1) if last_success else None,
+        }
+
+
+async def run_forever() -> None:
+    """
+    Standalone daemon: one long-lived client, store and token instead of a cold start per cron tick.
+    """
+    settings = get_settings()
+    if not settings.mongo_uri:
+        raise ValueError("MONGODB_URI is required to ingest Spotify plays.")
+
+    client = SpotifyClient(settings)
+    store = PlaybackStore.from_settings(settings)
+    await store.ensure_indexes()
+    scheduler = IngestScheduler.from_settings(settings, client, store)
+    try:
+        scheduler.start()
+        await asyncio.Event().wait()
+    finally:
+        await scheduler.stop()
+        await client.close()
+        await store.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(run_forever())
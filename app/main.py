@@ -1,14 +1,69 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
+from pymongo.errors import PyMongoError
 
 from app.config import get_settings
+from app.ingest_scheduler import IngestScheduler
+from app.offload import LoopLagMonitor
+from app.playback_store import PlaybackStore
 from app.routers import card, wrapped
+from app.spotify_client import SpotifyClient
+
 
+logger = logging.getLogger(__name__)
 
 settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    app.state.loop_lag = LoopLagMonitor(settings.loop_lag_interval)
+    app.state.loop_lag.start()
+    store = PlaybackStore.from_settings(settings) if settings.mongo_uri else None
+    if store:
+        try:
+            await store.ensure_indexes()
+        except PyMongoError:
+            # Keep serving the Spotify-only routes; the store reconnects on its own once Mongo is reachable.
+            logger.exception("Could not create MongoDB indexes at startup")
+    app.state.playback_store = store
+    columnar_load = None
+    if store and settings.analytics_engine == "columnar":
+        # Loads in the background; period views use MongoDB until the index is ready.
+        columnar_load = asyncio.create_task(store.enable_columnar(settings.columnar_snapshot_path))
+        columnar_load.add_done_callback(_log_columnar_failure)
+    app.state.spotify_client = SpotifyClient(settings)
+    app.state.ingest_scheduler = None
+    if store and settings.ingest_scheduler_enabled:
+        app.state.ingest_scheduler = IngestScheduler.from_settings(settings, app.state.spotify_client, store)
+        app.state.ingest_scheduler.start()
+    try:
+        yield
+    finally:
+        if app.state.ingest_scheduler:
+            await app.state.ingest_scheduler.stop()
+        await app.state.spotify_client.close()
+        if columnar_load and not columnar_load.done():
+            columnar_load.cancel()
+        if store:
+            await store.close()
+        await app.state.loop_lag.stop()
+
+
+def _log_columnar_failure(task: "asyncio.Task[None]") -> None:
+    if not task.cancelled() and task.exception():
+        logger.error("Could not load the columnar analytics engine", exc_info=task.exception())
+
+
 app = FastAPI(
     title="Rewrapped API",
     version="0.1.0",
     description="Generate Spotify Wrapped-style summaries using the Spotify Web API.",
+    lifespan=lifespan,
 )
 
 
@@ -17,6 +72,18 @@ async def health() -> dict:
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics() -> dict:
+    scheduler = app.state.ingest_scheduler
+    store = app.state.playback_store
+    return {
+        "spotify": app.state.spotify_client.stats(),
+        "ingest": scheduler.status() if scheduler else None,
+        "analytics": store.analytics_stats() if store else None,
+        "event_loop": app.state.loop_lag.stats(),
+    }
+
+
 @app.get("/")
 async def root() -> dict:
     return {
@@ -0,0 +1,44 @@
+import asyncio
+import logging
+from typing import List
+
+from app.config import get_settings
+from app.playback_store import PlaybackStore
+
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = ("dimensions", "v2")
+
+
+async def migrate(steps: List[str], batch_size: int = 1000) -> None:
+    """
+    Run storage migrations against the configured database. Each step is batched and checkpointed
+    in the state collection, so it can run while the API and ingesters are up and be re-run safely.
+    """
+    settings = get_settings()
+    if not settings.mongo_uri:
+        raise ValueError("MONGODB_URI is required to run migrations.")
+
+    store = PlaybackStore.from_settings(settings)
+    try:
+        await store.ensure_indexes()
+        if "dimensions" in steps:
+            rewritten = await store.extract_dimensions(batch_size=batch_size)
+            logger.info("Moved embedded track/album metadata out of %s plays", rewritten)
+        if "v2" in steps:
+            converted = await store.migrate_to_v2(batch_size=batch_size)
+            logger.info("Converted %s plays to the v2 schema", converted)
+    finally:
+        await store.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Migrate stored plays to the current schema.")
+    parser.add_argument("steps", nargs="*", choices=MIGRATIONS, help="Steps to run (default: all).")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Plays rewritten per batch.")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.steps or list(MIGRATIONS), batch_size=args.batch_size))
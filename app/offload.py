@@ -0,0 +1,133 @@
+import asyncio
+import functools
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+from app.config import Settings
+
+
+EXECUTORS = ("thread", "process", "inline")
+# Lag samples kept for /metrics (two minutes at the default interval).
+LAG_WINDOW = 240
+
+
+class AnalyticsOffload:
+    """
+    Runs CPU-bound summary work off the event loop once it is big enough to matter: in a thread
+    or process pool, or inline for small work and with executor="inline". Threads still share the
+    GIL but it is released every few milliseconds, so other requests keep being served; processes
+    run in parallel at the cost of pickling their input and result.
+    """
+
+    def __init__(self, executor: str = "inline", workers: int = 2, threshold: int = 5000) -> None:
+        if executor not in EXECUTORS:
+            raise ValueError(f"ANALYTICS_EXECUTOR must be one of {', '.join(EXECUTORS)}, not {executor!r}.")
+        self.executor = executor
+        self.workers = max(1, workers)
+        self.threshold = max(0, threshold)
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._counters = {"inline": 0, "offloaded": 0, "offloaded_seconds": 0.0}
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "AnalyticsOffload":
+        return cls(
+            executor=settings.analytics_executor,
+            workers=settings.analytics_workers,
+            threshold=settings.analytics_offload_threshold,
+        )
+
+    async def run(self, func: Callable[..., Any], *args: Any, size: int, picklable: bool = True) -> Any:
+        """
+        func(*args), in the pool when size (plays involved) reaches the threshold. Work on shared
+        in-memory state (picklable=False) always goes to a thread, even with executor="process".
+        """
+        if self.executor == "inline" or size < self.threshold:
+            self._counters["inline"] += 1
+            return func(*args)
+        started = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(picklable), functools.partial(func, *args))
+        finally:
+            self._counters["offloaded"] += 1
+            self._counters["offloaded_seconds"] += time.monotonic() - started
+
+    def _pool(self, picklable: bool) -> Executor:
+        if self.executor == "process" and picklable:
+            if self._processes is None:
+                # Spawned, not forked: the API process has driver threads and a running loop.
+                self._processes = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._processes
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(self.workers, thread_name_prefix="analytics")
+        return self._threads
+
+    def close(self) -> None:
+        for pool in (self._threads, self._processes):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._threads = self._processes = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executor": self.executor,
+            "workers": self.workers,
+            "threshold": self.threshold,
+            **self._counters,
+            "offloaded_seconds": round(self._counters["offloaded_seconds"], 3),
+        }
+
+
+class LoopLagMonitor:
+    """
+    Samples event-loop lag: how late a sleep of `interval` seconds wakes up. Anything that holds
+    the loop (a large summary counted inline, a blocking call) shows up as lag for every request
+    on the worker, /health included.
+    """
+
+    def __init__(self, interval: float = 0.5) -> None:
+        self.interval = max(interval, 0.01)
+        self._samples: Deque[float] = deque(maxlen=LAG_WINDOW)
+        self._max_seen = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - expected)
+            self._samples.append(lag)
+            self._max_seen = max(self._max_seen, lag)
+
+    def stats(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+
+        def ms(value: float) -> float:
+            return round(value * 1000, 1)
+
+        return {
+            "interval_seconds": self.interval,
+            "window_seconds": round(len(samples) * self.interval, 1),
+            "last_ms": ms(self._samples[-1]) if samples else None,
+            "mean_ms": ms(sum(samples) / len(samples)) if samples else None,
+            "p99_ms": ms(samples[min(len(samples) - 1, int(len(samples) * 0.99))]) if samples else None,
+            "max_ms": ms(samples[-1]) if samples else None,
+            "max_ms_since_start": ms(self._max_seen),
+        }
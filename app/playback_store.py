@@ -1,74 +1,818 @@
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
 
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
 
+from app import analytics
+from app.cache import TTLCache
+from app.columnar import ColumnarIndex
 from app.config import Settings
+from app.offload import AnalyticsOffload
+
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+RECENT_HIGH_WATER_KEY = "recently_played"
+DIMENSIONS_MIGRATION_KEY = "migration:dimensions"
+V2_MIGRATION_KEY = "migration:v2"
+ROLLUPS_KEY = "rollups"
+# Bumped whenever the rollup rows change shape; older rollups are ignored until rebuilt.
+ROLLUPS_VERSION = 1
+# How often the rollups state is re-read, so a rebuild started by another process is noticed.
+ROLLUPS_RECHECK_SECONDS = 30.0
+# Time a rebuild gives writers that read the rollups state just before it to finish their updates.
+ROLLUPS_REBUILD_SETTLE_SECONDS = 2.0
+# Full recounts a rebuild makes before giving up on plays that keep arriving during the scan.
+ROLLUPS_REBUILD_ATTEMPTS = 3
+# Ingestion schedulers record when they will poll next under this prefix (one doc per process).
+INGEST_HEARTBEAT_PREFIX = "heartbeat:"
+# How long after its announced next poll a scheduler still counts as running.
+INGEST_HEARTBEAT_GRACE_SECONDS = 120.0
+# How often the columnar engine checks whether another process has written plays it has not seen.
+COLUMNAR_RECHECK_SECONDS = 60.0
+SCHEMA_VERSION = 2
+DIMENSION_CACHE_TTL = 300.0
+# Per-play copies of track/album metadata that older plays embedded; it now lives in the dimensions.
+LEGACY_TRACK_FIELDS = ("album", "popularity", "external_urls", "explicit")
+PLAY_BATCH_SIZE = 2000
+# Stored play fields (v2 names) the summaries read; context URIs are never fetched for them.
+SUMMARY_FIELDS = ("t", "n", "d", "a", "al")
+# Where each v2 field lives on a v1 play, so one projection covers both schemas.
+V1_FIELDS = {
+    "t": ("track.id", "track.name"),
+    "n": ("track.name",),
+    "d": ("track.duration_ms",),
+    "a": ("track.artists",),
+    "al": ("track.album_key", "track.album"),
+    "c": ("context",),
+}
 
 
 class PlaybackStore:
     """
     Thin wrapper around a MongoDB collection that stores recent Spotify plays.
     Documents are keyed by the precise played_at timestamp to prevent overlap.
+    Track and album metadata is kept once per entity in the tracks/albums dimension collections;
+    plays only reference them (track id, album key, artist names).
+
+    Plays use the compact v2 schema: {_id: played_at, v, t: track id, n: name (only without an id),
+    d: duration_ms, a: artist names, al: album key, c: context URI}. Readers also accept v1 plays
+    (ISO string _id, nested "track") until `python -m app.migrate v2` has converted them.
     """
 
-    def __init__(self, mongo_uri: str, db_name: str, collection_name: str) -> None:
+    def __init__(
+        self,
+        mongo_uri: str,
+        db_name: str,
+        collection_name: str,
+        state_collection_name: str = "ingest_state",
+        tracks_collection_name: str = "tracks",
+        albums_collection_name: str = "albums",
+        rollups_collection_name: str = "rollups",
+        dimension_cache_size: int = 10000,
+        analytics_engine: str = "mongo",
+        offload: Optional[AnalyticsOffload] = None,
+        **client_options: Any,
+    ) -> None:
         if not mongo_uri:
             raise ValueError("MONGODB_URI is required to use the playback store.")
-        self._client = AsyncIOMotorClient(mongo_uri)
+        self._client = AsyncIOMotorClient(mongo_uri, **client_options)
         self._collection: AsyncIOMotorCollection = self._client[db_name][collection_name]
+        # Small bookkeeping collection for ingestion progress (import checkpoints and the like).
+        self._state: AsyncIOMotorCollection = self._client[db_name][state_collection_name]
+        self._tracks: AsyncIOMotorCollection = self._client[db_name][tracks_collection_name]
+        self._albums: AsyncIOMotorCollection = self._client[db_name][albums_collection_name]
+        # Per-month and per-day counters (one doc per period/kind/key) kept up to date as plays are inserted.
+        self._rollups: AsyncIOMotorCollection = self._client[db_name][rollups_collection_name]
+        self._rollups_built = False
+        self._rollups_checked = 0.0
+        # "stream" counts summaries in this process from a projected cursor instead of in MongoDB.
+        self._stream_summaries = analytics_engine == "stream"
+        # Where in-process summary counting runs once it is large enough to stall the event loop.
+        self._offload = offload or AnalyticsOffload()
+        # Optional in-memory engine (enable_columnar); summaries come from it once loaded.
+        self._columnar: Optional[ColumnarIndex] = None
+        self._columnar_path = ""
+        self._columnar_checked = 0.0
+        self._columnar_reload: Optional["asyncio.Task[None]"] = None
+        # Dimension docs by (collection, _id); misses are cached as None too.
+        self._dimension_cache = TTLCache(max_entries=dimension_cache_size)
+        # Whether v1 plays may still exist; settled by ensure_indexes.
+        self._legacy_plays = True
 
     @classmethod
     def from_settings(cls, settings: Settings) -> "PlaybackStore":
-        return cls(settings.mongo_uri, settings.mongo_db, settings.mongo_collection)
+        return cls(
+            settings.mongo_uri,
+            settings.mongo_db,
+            settings.mongo_collection,
+            state_collection_name=settings.mongo_state_collection,
+            tracks_collection_name=settings.mongo_tracks_collection,
+            albums_collection_name=settings.mongo_albums_collection,
+            rollups_collection_name=settings.mongo_rollups_collection,
+            dimension_cache_size=settings.mongo_dimension_cache_size,
+            analytics_engine=settings.analytics_engine,
+            offload=AnalyticsOffload.from_settings(settings),
+            maxPoolSize=settings.mongo_max_pool_size,
+            minPoolSize=settings.mongo_min_pool_size,
+            serverSelectionTimeoutMS=settings.mongo_server_selection_timeout_ms,
+            connectTimeoutMS=settings.mongo_connect_timeout_ms,
+            socketTimeoutMS=settings.mongo_socket_timeout_ms,
+        )
 
     async def close(self) -> None:
+        if self._columnar_reload:
+            self._columnar_reload.cancel()
+        # Nothing appended since the snapshot was loaded or written: leave it (and other workers') alone.
+        if self._columnar is not None and self._columnar_path and self._columnar.dirty:
+            self._columnar.save(self._columnar_path)
+        self._offload.close()
         self._client.close()
 
     async def ensure_indexes(self) -> None:
-        # Guarantee uniqueness and allow efficient time-bounded queries.
-        await self._collection.create_index("played_at", unique=True)
-        await self._collection.create_index("track.id")
-        await self._collection.create_index([("played_at", -1)])
+        # v2 plays are keyed by played_at itself, so _id alone gives uniqueness and range scans.
+        indexes = await self._collection.index_information()
+        # played_at descending duplicated the unique ascending index; track.id has had no readers
+        # since artwork moved to the dimensions.
+        for name in ("played_at_-1", "track.id_1"):
+            if name in indexes:
+                await self._collection.drop_index(name)
+        self._legacy_plays = await self._has_legacy_plays()
+        legacy_index = indexes.get("played_at_1")
+        if legacy_index and (not self._legacy_plays or not legacy_index.get("partialFilterExpression")):
+            # A plain unique index would treat every v2 play (no played_at field) as a duplicate null.
+            await self._collection.drop_index("played_at_1")
+            legacy_index = None
+        if self._legacy_plays and not legacy_index:
+            await self._collection.create_index(
+                "played_at", unique=True, partialFilterExpression={"played_at": {"$exists": True}}
+            )
+        # Work queue for the artwork backfill: only flagged tracks are indexed, so it stays tiny.
+        await self._tracks.create_index(
+            [("needs_images", 1), ("_id", 1)],
+            name="needs_images_queue",
+            partialFilterExpression={"needs_images": True},
+        )
+        await self._rollups.create_index([("p", 1), ("k", 1)])
+        if not await self._rollups_ready() and not await self._collection.find_one({}, projection={"_id": 1}):
+            # Nothing stored yet, so incremental updates alone keep the rollups complete.
+            await self._mark_rollups_built()
+
+    async def _has_legacy_plays(self) -> bool:
+        state = await self._state.find_one({"_id": V2_MIGRATION_KEY})
+        if state and state.get("completed"):
+            return False
+        # v1 _ids are strings; the bound keeps this an _id index lookup instead of a scan.
+        if await self._collection.find_one({"_id": {"$gte": ""}}, projection={"_id": 1}):
+            return True
+        await self._state.update_one(
+            {"_id": V2_MIGRATION_KEY}, {"$set": {"completed": True, "updated_at": datetime.now(timezone.utc)}}, upsert=True
+        )
+        return False
+
+    def _between(self, start: datetime, end: datetime) -> Dict[str, Any]:
+        by_id = {"_id": {"$gte": start, "$lt": end}}
+        if not self._legacy_plays:
+            return by_id
+        return {"$or": [by_id, {"played_at": {"$gte": start, "$lt": end}}]}
 
     async def save_recently_played(self, items: List[Dict[str, Any]]) -> Dict[str, int]:
         """
-        Upsert each play by played_at timestamp to avoid overlap/duplicates.
+        Bulk insert plays keyed by played_at; plays already stored are counted as skipped.
+        Track/album metadata is upserted into the dimensions first so every stored play resolves.
+        """
+        docs = [doc for doc in (self._to_document(item) for item in items) if doc]
+        if not docs:
+            return {"inserted": 0, "skipped": 0}
+        await self._save_dimensions(items)
+        inserted = await self._insert_documents(await self._without_legacy_copies(docs))
+        # Only plays that were actually new are counted, so re-imports never inflate the rollups.
+        if inserted and await self._rollups_writable():
+            await self._apply_rollups(_rollup_increments(_as_v1(doc) for doc in inserted))
+        if self._columnar is not None:
+            # A catch-up scan running meanwhile may already have appended some of these plays.
+            self._columnar.extend_unseen(_as_v1(doc) for doc in inserted)
+        return {"inserted": len(inserted), "skipped": len(docs) - len(inserted)}
+
+    async def _without_legacy_copies(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # A play still stored as v1 has a string _id, so the v2 insert would not collide with it.
+        # Until the v2 migration finishes, look those up by played_at instead (one query per batch).
+        if not self._legacy_plays:
+            return docs
+        cursor = self._collection.find({"played_at": {"$in": [doc["_id"] for doc in docs]}}, projection={"played_at": 1})
+        stored = {_as_utc(doc["played_at"]) for doc in await cursor.to_list(length=None)}
+        return [doc for doc in docs if doc["_id"] not in stored]
+
+    async def _insert_documents(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Unordered so one duplicate does not stop the rest of the batch; the whole
+        # batch goes out in a single round trip instead of one upsert per play.
+        if not docs:
+            return []
+        try:
+            await self._collection.insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            errors = exc.details.get("writeErrors", [])
+            if exc.details.get("writeConcernErrors") or any(err.get("code") != DUPLICATE_KEY_ERROR for err in errors):
+                raise
+            failed = {err["index"] for err in errors}
+            return [doc for idx, doc in enumerate(docs) if idx not in failed]
+        return docs
+
+    async def fetch_between(self, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """
+        Plays in [start, end) with their track/album metadata joined back in from the dimensions.
         """
-        counts = {"inserted": 0, "skipped": 0}
+        return [play async for play in self.iter_between(start, end)]
+
+    async def iter_between(
+        self,
+        start: datetime,
+        end: datetime,
+        fields: Optional[Iterable[str]] = None,
+        batch_size: int = PLAY_BATCH_SIZE,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        fetch_between as a stream: plays come out in played_at order, hydrated one batch at a time,
+        so at most batch_size of them are in memory. fields (v2 names, e.g. SUMMARY_FIELDS) limits
+        what is read from each stored play; everything else stays on the server, and plays are
+        hydrated with just the name/album/artwork that summaries use.
+        """
+        async for batch in self._iter_batches(start, end, fields, batch_size):
+            for play in batch:
+                yield play
+
+    async def _iter_batches(
+        self, start: datetime, end: datetime, fields: Optional[Iterable[str]], batch_size: int
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        projection = _play_projection(fields)
+        cursors = [
+            self._collection.find({"_id": {"$gte": start, "$lt": end}}, projection=projection, batch_size=batch_size)
+            .sort("_id", 1)
+        ]
+        if self._legacy_plays:
+            v1_projection = _play_projection(fields, legacy=True)
+            cursors.append(
+                self._collection.find(
+                    {"played_at": {"$gte": start, "$lt": end}}, projection=v1_projection, batch_size=batch_size
+                ).sort("played_at", 1)
+            )
+        batch: List[Dict[str, Any]] = []
+        async for doc in _merge_by_played_at(cursors):
+            batch.append(_as_v1(doc))
+            if len(batch) >= batch_size:
+                yield await self._hydrate_plays(batch, full=fields is None)
+                batch = []
+        if batch:
+            yield await self._hydrate_plays(batch, full=fields is None)
+
+    async def _hydrate_plays(self, plays: List[Dict[str, Any]], full: bool = True) -> List[Dict[str, Any]]:
+        tracks = await self._lookup(self._tracks, {play["track"]["id"] for play in plays if _track_id(play)})
+        albums = await self._lookup(self._albums, {_stored_album_key(play.get("track") or {}) for play in plays})
+        for play in plays:
+            if play.get("track"):
+                play["track"] = _hydrate_track(play["track"], tracks, albums, full=full)
+        return plays
+
+    async def summarize_period(self, start: datetime, end: datetime, limit: int = 20) -> Dict[str, Any]:
+        """
+        Summary for [start, end). Day-aligned ranges are merged from the rollups: whole UTC months
+        from the monthly rows and the partial months at either edge from the daily rows, so cost
+        follows the number of days (a year is twelve months of counters), not the number of plays.
+        Other ranges, or a database whose rollups have not been built yet, fall back to summarize_between.
+        """
+        if self._columnar is not None:
+            return await self._summarize_columnar(start, end, limit)
+        if self._stream_summaries:
+            return await self.summarize_streaming(start, end, limit=limit)
+        periods = _rollup_periods(start, end)
+        if not periods or not await self._rollups_ready():
+            return await self.summarize_between(start, end, limit=limit)
+        return await self._summarize_rollups(periods, limit)
+
+    async def enable_columnar(self, snapshot_path: str = "") -> None:
+        """
+        Serve summaries from an in-memory ColumnarIndex of every play. A snapshot at snapshot_path
+        is memory-mapped and caught up with the plays stored after its newest one; without a usable
+        snapshot, plays are streamed from MongoDB once. The snapshot is rewritten whenever plays were
+        added. Until this returns, the Mongo paths are used.
+        """
+        self._columnar_path = snapshot_path
+        index = ColumnarIndex.load(snapshot_path) if snapshot_path else None
+        if index is None or not await self._catch_up_columnar(index):
+            index = await self._load_columnar()
+        if snapshot_path and index.dirty:
+            index.save(snapshot_path)
+        self._columnar = index
+        self._columnar_checked = time.monotonic()
+        logger.info("Columnar analytics engine loaded %s plays", len(index))
+
+    async def _load_columnar(self) -> ColumnarIndex:
+        index = ColumnarIndex()
+        batch: List[Dict[str, Any]] = []
+        async for doc in self._collection.find({}, batch_size=5000):
+            batch.append(_as_v1(doc))
+            if len(batch) >= 5000:
+                index.extend(batch)
+                batch = []
+        index.extend(batch)
+        return index
+
+    async def _catch_up_columnar(self, index: ColumnarIndex) -> bool:
+        # Streams only the plays after the newest one indexed. Plays removed, or older ones added
+        # behind it (a dump import), leave the counts apart; False then means load everything again.
+        if await self._collection.estimated_document_count() < len(index):
+            return False
+        newest_ms = index.newest_ms()
+        query: Dict[str, Any] = {}
+        if newest_ms is not None:
+            newest = datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(milliseconds=newest_ms)
+            query = {"_id": {"$gt": newest}}
+            if self._legacy_plays:
+                query = {"$or": [query, {"played_at": {"$gt": newest}}]}
+        added = 0
+        batch: List[Dict[str, Any]] = []
+        async for doc in self._collection.find(query, batch_size=5000):
+            batch.append(_as_v1(doc))
+            if len(batch) >= 5000:
+                added += index.extend_unseen(batch)
+                batch = []
+        added += index.extend_unseen(batch)
+        if added:
+            logger.info("Columnar analytics engine caught up on %s plays", added)
+        return len(index) == await self._collection.estimated_document_count()
+
+    async def _summarize_columnar(self, start: datetime, end: datetime, limit: int) -> Dict[str, Any]:
+        await self._recheck_columnar()
+        index, start_ms, end_ms = self._columnar, _epoch_ms(start), _epoch_ms(end)
+        # NumPy releases the GIL for the heavy parts; the index itself is shared, so threads only.
+        result = await self._offload.run(
+            index.summarize, start_ms, end_ms, limit, size=index.count(start_ms, end_ms), picklable=False
+        )
+        await self._attach_metadata(result.get("top_tracks") or [], result.get("top_albums") or [])
+        return analytics.summarize_month_from_aggregate(result)
+
+    async def _recheck_columnar(self) -> None:
+        # Plays written by other processes (dump imports, the cron ingester) never pass through
+        # this store, so a changed count triggers a background reload; the old index serves meanwhile.
+        if time.monotonic() - self._columnar_checked < COLUMNAR_RECHECK_SECONDS:
+            return
+        self._columnar_checked = time.monotonic()
+        if self._columnar_reload and not self._columnar_reload.done():
+            return
+        if await self._collection.estimated_document_count() != len(self._columnar):
+            self._columnar_reload = asyncio.create_task(self._refresh_columnar())
+
+    async def _refresh_columnar(self) -> None:
+        # Catch up the live index in place; only a mismatch costs a full load, which the old index
+        # serves through and is then swapped for.
+        if await self._catch_up_columnar(self._columnar):
+            return
+        index = await self._load_columnar()
+        if self._columnar_path:
+            index.save(self._columnar_path)
+        self._columnar = index
+        logger.info("Columnar analytics engine reloaded %s plays", len(index))
+
+    async def first_played_at(self) -> Optional[datetime]:
+        # Dates sort after strings, so the bound keeps this on v2 plays (and the _id index).
+        candidates = [await self._collection.find_one({"_id": {"$gte": datetime(1970, 1, 1)}}, projection={"_id": 1}, sort=[("_id", 1)])]
+        if self._legacy_plays:
+            candidates.append(
+                await self._collection.find_one(
+                    {"played_at": {"$exists": True}}, projection={"played_at": 1}, sort=[("played_at", 1)]
+                )
+            )
+        return min((_played_at(doc) for doc in candidates if doc), default=None)
+
+    async def _summarize_rollups(self, periods: List[str], limit: int) -> Dict[str, Any]:
+        cursor = self._rollups.aggregate(_rollup_pipeline(periods, limit), allowDiskUse=True)
+        results = await cursor.to_list(length=1)
+        result = _rollup_result(results[0] if results else {})
+        await self._attach_metadata(result["top_tracks"], result["top_albums"])
+        return analytics.summarize_month_from_aggregate(result)
+
+    async def _apply_rollups(self, rows: Dict[str, Dict[str, Any]]) -> None:
+        requests = []
+        for row_id, row in rows.items():
+            update: Dict[str, Any] = {
+                "$setOnInsert": {"p": row["p"], "k": row["k"], "key": row["key"]},
+                "$inc": {field: row[field] for field in ("c", "d", "n") if row.get(field)},
+            }
+            if row.get("f"):
+                update["$min"] = {"f": row["f"]}
+            if row.get("l"):
+                update["$max"] = {"l": row["l"]}
+            requests.append(UpdateOne({"_id": row_id}, update, upsert=True))
+        for _ in range(2):
+            if not requests:
+                return
+            try:
+                await self._rollups.bulk_write(requests, ordered=False)
+                return
+            except BulkWriteError as exc:
+                # Two writers upserting the same new row: the loser retries as a plain update.
+                errors = exc.details.get("writeErrors", [])
+                if exc.details.get("writeConcernErrors") or any(err.get("code") != DUPLICATE_KEY_ERROR for err in errors):
+                    raise
+                requests = [requests[err["index"]] for err in errors]
+        raise RuntimeError("Could not apply rollup updates after retrying duplicate upserts.")
+
+    async def _rollups_ready(self) -> bool:
+        # Re-read every ROLLUPS_RECHECK_SECONDS even once built: rebuild_rollups in another process
+        # clears the flag first, and this process must stop reading the counters it is recounting.
+        if not self._rollups_built or time.monotonic() - self._rollups_checked >= ROLLUPS_RECHECK_SECONDS:
+            state = await self._state.find_one({"_id": ROLLUPS_KEY})
+            self._rollups_built = bool(state and state.get("built") and state.get("version") == ROLLUPS_VERSION)
+            self._rollups_checked = time.monotonic()
+        return self._rollups_built
+
+    async def _rollups_writable(self) -> bool:
+        # Read fresh on every write, not through _rollups_ready: while a rebuild (or the first build)
+        # is counting, its scan picks these plays up, and bumping the counters too would count them twice.
+        state = await self._state.find_one({"_id": ROLLUPS_KEY}, projection={"built": 1, "version": 1})
+        return bool(state and state.get("built") and state.get("version") == ROLLUPS_VERSION)
+
+    async def _mark_rollups_built(self) -> None:
+        await self._state.update_one(
+            {"_id": ROLLUPS_KEY},
+            {"$set": {"built": True, "version": ROLLUPS_VERSION, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        self._rollups_built = True
+        self._rollups_checked = time.monotonic()
+
+    async def rebuild_rollups(self, batch_size: int = 5000) -> int:
+        """
+        Recount every rollup from the stored plays. Counters are order independent ($inc/$min/$max),
+        so plays are streamed in natural order. Refuses to start while an ingestion scheduler is
+        running. Writers stop bumping the counters until it finishes, and plays they insert behind the
+        scan are caught by comparing counts and recounting. Other API processes fall back to raw plays
+        within ROLLUPS_RECHECK_SECONDS. Returns plays counted.
+        """
+        running = await self.running_schedulers()
+        if running:
+            raise RuntimeError(f"Ingestion is running ({', '.join(running)}); stop the scheduler before rebuilding rollups.")
+        await self._state.update_one({"_id": ROLLUPS_KEY}, {"$set": {"built": False}}, upsert=True)
+        self._rollups_built = False
+        await asyncio.sleep(ROLLUPS_REBUILD_SETTLE_SECONDS)
+        for _ in range(ROLLUPS_REBUILD_ATTEMPTS):
+            counted = await self._recount_rollups(batch_size)
+            if counted == await self._collection.count_documents({}):
+                await self._mark_rollups_built()
+                return counted
+            logger.info("Plays arrived while rollups were recounted; counting again")
+        raise RuntimeError("Plays kept arriving while rollups were rebuilt; pause ingestion and run it again.")
+
+    async def _recount_rollups(self, batch_size: int) -> int:
+        await self._rollups.delete_many({})
+        counted = 0
+        batch: List[Dict[str, Any]] = []
+        async for doc in self._collection.find({}, batch_size=batch_size):
+            batch.append(_as_v1(doc))
+            if len(batch) >= batch_size:
+                counted += await self._rollup_batch(batch)
+                batch = []
+        if batch:
+            counted += await self._rollup_batch(batch)
+        return counted
+
+    async def check_rollups(self) -> Dict[str, int]:
+        """
+        Plays stored vs plays counted in the monthly totals. Rollups are bumped after the plays are
+        inserted, so a writer that dies in between leaves them short (a retry skips the plays as
+        duplicates); a difference means rebuild_rollups is due. Only exact while nothing is ingesting.
+        """
+        cursor = self._rollups.aggregate(
+            [
+                {"$match": {"k": "total", "p": {"$regex": r"^\d{4}-\d{2}$"}}},
+                {"$group": {"_id": None, "n": {"$sum": "$n"}}},
+            ]
+        )
+        totals = await cursor.to_list(length=1)
+        return {"plays": await self._collection.count_documents({}), "rolled_up": totals[0]["n"] if totals else 0}
+
+    async def _rollup_batch(self, plays: List[Dict[str, Any]]) -> int:
+        # Rollups carry no names or artwork, so metadata still embedded in v1 plays must reach the dimensions.
+        embedded = [play for play in plays if _embeds_metadata(play)]
+        if embedded:
+            await self._save_dimensions(embedded)
+        await self._apply_rollups(_rollup_increments(plays))
+        return len(plays)
+
+    async def summarize_between(self, start: datetime, end: datetime, limit: int = 20) -> Dict[str, Any]:
+        """
+        Same output as analytics.summarize_month_from_plays, but counted inside MongoDB so only
+        the totals and the top rows cross the wire. Names and artwork are looked up for those rows only.
+        """
+        pipeline = _summary_pipeline(self._between(start, end), limit, sort_by_id=not self._legacy_plays)
+        cursor = self._collection.aggregate(pipeline, allowDiskUse=True)
+        results = await cursor.to_list(length=1)
+        result = results[0] if results else {}
+        await self._attach_metadata(result.get("top_tracks") or [], result.get("top_albums") or [])
+        return analytics.summarize_month_from_aggregate(result)
+
+    async def summarize_streaming(self, start: datetime, end: datetime, limit: int = 20) -> Dict[str, Any]:
+        """
+        analytics.summarize_month_from_plays counted here as plays stream off a projected cursor:
+        memory follows the number of distinct tracks/albums/artists, not the number of plays.
+        Each batch is tallied in the offload pool once the range has passed its threshold.
+        """
+        tally = analytics.PlayTally()
+        seen = 0
+        async for batch in self._iter_batches(start, end, SUMMARY_FIELDS, PLAY_BATCH_SIZE):
+            seen += len(batch)
+            tally.merge(await self._offload.run(analytics.tally_plays, batch, size=seen))
+        return tally.summary(limit)
+
+    def analytics_stats(self) -> Dict[str, Any]:
+        return self._offload.stats()
+
+    async def _attach_metadata(self, track_rows: List[Dict[str, Any]], album_rows: List[Dict[str, Any]]) -> None:
+        tracks = await self._lookup(self._tracks, {row["_id"] for row in track_rows})
+        # Only the album the play itself referenced, as in summarize_month_from_plays: a play that
+        # stored none shows none, whatever the track dimension has been linked to since.
+        albums = await self._lookup(self._albums, {row.get("album_ref") for row in track_rows + album_rows})
+        for row in track_rows:
+            album = albums.get(row.get("album_ref")) or {}
+            row["name"] = (tracks.get(row["_id"]) or {}).get("name") or row.get("name")
+            row["album"] = album.get("name") or row.get("album_name")
+            row["images"] = album.get("images") or row.get("images") or []
+        for row in album_rows:
+            album = albums.get(row.get("album_ref")) or {}
+            row["name"] = album.get("name") or row.get("album_name")
+            row["images"] = album.get("images") or row.get("images") or []
+
+    async def _lookup(self, collection: AsyncIOMotorCollection, keys: Iterable[Optional[str]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Dimension docs by _id, served from the in-process cache where possible and one $in query otherwise.
+        """
+        found: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for key in keys:
+            if key is None:
+                continue
+            entry = self._dimension_cache.lookup((collection.name, key))
+            if entry is None or not entry.fresh:
+                missing.append(key)
+            elif entry.value is not None:
+                found[key] = entry.value
+        if missing:
+            fetched = {doc["_id"]: doc async for doc in collection.find({"_id": {"$in": missing}})}
+            for key in missing:
+                self._dimension_cache.set((collection.name, key), fetched.get(key), DIMENSION_CACHE_TTL)
+            found.update(fetched)
+        return found
+
+    async def _save_dimensions(self, items: List[Dict[str, Any]]) -> None:
+        """
+        Upsert one track/album dimension doc per entity in items (later items win). Entities whose
+        cached copy already matches are skipped, so steady-state polling rarely writes here at all.
+        """
+        tracks: Dict[str, Dict[str, Any]] = {}
+        albums: Dict[str, Dict[str, Any]] = {}
         for item in items:
-            doc = self._to_document(item)
-            if not doc:
+            track = item.get("track") or {}
+            album = track.get("album") or {}
+            album_key = analytics.album_key(album, [artist["name"] for artist in track.get("artists", []) if artist.get("name")])
+            if album_key:
+                fields = albums.setdefault(album_key, {})
+                fields.update(_without_none({"name": album.get("name"), "spotify_id": album.get("id")}))
+                if album.get("images"):
+                    fields["images"] = album["images"]
+            if track.get("id"):
+                # Merged like albums, so a later item without an album (a dump row) keeps the earlier link.
+                fields = tracks.setdefault(track["id"], {})
+                fields.update(
+                    _without_none(
+                        {
+                            "name": track.get("name"),
+                            "album": album_key,
+                            "popularity": track.get("popularity"),
+                            "explicit": track.get("explicit"),
+                            "external_urls": track.get("external_urls"),
+                        }
+                    )
+                )
+
+        album_requests = [
+            UpdateOne({"_id": key}, {"$set": fields}, upsert=True)
+            for key, fields in albums.items()
+            if not self._dimension_unchanged(self._albums, key, fields)
+        ]
+        track_requests = []
+        for track_id, fields in tracks.items():
+            if self._dimension_unchanged(self._tracks, track_id, fields):
                 continue
-            result = await self._collection.update_one({"_id": doc["_id"]}, {"$setOnInsert": doc}, upsert=True)
-            if result.upserted_id:
-                counts["inserted"] += 1
+            update: Dict[str, Any] = {"$set": fields}
+            if albums.get(fields.get("album"), {}).get("images"):
+                update["$unset"] = {"needs_images": ""}
             else:
-                counts["skipped"] += 1
-        return counts
+                # Queue for the artwork backfill (tracks without an album reference included).
+                update["$setOnInsert"] = {"needs_images": True}
+            track_requests.append(UpdateOne({"_id": track_id}, update, upsert=True))
 
-    async def fetch_between(self, start: datetime, end: datetime) -> List[Dict[str, Any]]:
-        cursor = self._collection.find({"played_at": {"$gte": start, "$lt": end}}).sort("played_at", 1)
-        return await cursor.to_list(length=None)
-
-    async def track_ids_missing_images(self, limit: int = 500) -> List[str]:
-        query = {
-            "track.id": {"$ne": None, "$exists": True},
-            "$or": [
-                {"track.album.images": {"$exists": False}},
-                {"track.album.images": {"$size": 0}},
-                {"track.album.images": []},
-            ],
-        }
-        ids = await self._collection.distinct("track.id", filter=query)
-        return list(ids)[:limit]
+        if album_requests:
+            await self._albums.bulk_write(album_requests, ordered=False)
+        if track_requests:
+            await self._tracks.bulk_write(track_requests, ordered=False)
+        for collection, written in ((self._albums, albums), (self._tracks, tracks)):
+            for key, fields in written.items():
+                cached = self._dimension_cache.lookup((collection.name, key))
+                base = cached.value if cached is not None and cached.value else {"_id": key}
+                self._dimension_cache.set((collection.name, key), {**base, **fields}, DIMENSION_CACHE_TTL)
+
+    def _dimension_unchanged(self, collection: AsyncIOMotorCollection, key: str, fields: Dict[str, Any]) -> bool:
+        entry = self._dimension_cache.lookup((collection.name, key))
+        if entry is None or not entry.fresh or entry.value is None:
+            return False
+        return all(entry.value.get(name) == value for name, value in fields.items())
+
+    async def track_ids_missing_images(self, limit: int = 500, after: Optional[str] = None) -> List[str]:
+        """
+        Next track IDs (in ID order, strictly after `after`) flagged as needing album art.
+        Walks the partial needs_images index on the tracks dimension with a covered query.
+        """
+        query: Dict[str, Any] = {"needs_images": True}
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        cursor = (
+            self._tracks.find(query, projection={"_id": 1})
+            .sort([("needs_images", 1), ("_id", 1)])
+            .hint("needs_images_queue")
+            .limit(limit)
+        )
+        return [doc["_id"] async for doc in cursor]
+
+    async def save_album_artwork(
+        self, details: Dict[str, Dict[str, Any]], checked_track_ids: Optional[List[str]] = None
+    ) -> int:
+        """
+        Store album art from /tracks details with one write per album, then take the tracks (plus any
+        other checked_track_ids Spotify had no art for) off the backfill queue. Returns albums updated.
+        """
+        tracks = await self._lookup(self._tracks, details.keys())
+        albums: Dict[str, Dict[str, Any]] = {}
+        track_requests = []
+        for track_id, track in details.items():
+            album = track.get("album") or {}
+            album_key = (tracks.get(track_id) or {}).get("album") or album.get("id")
+            if not album_key or not album.get("images"):
+                continue
+            albums[album_key] = {"images": album["images"], **_without_none({"spotify_id": album.get("id")})}
+            if not (tracks.get(track_id) or {}).get("album"):
+                # Dump rows without an album name: link the track to the album Spotify reports.
+                albums[album_key].update(_without_none({"name": album.get("name")}))
+                track_requests.append(UpdateOne({"_id": track_id}, {"$set": {"album": album_key}}))
+
+        checked = set(checked_track_ids or []) | set(details)
+        if checked:
+            track_requests.append(UpdateMany({"_id": {"$in": sorted(checked)}}, {"$unset": {"needs_images": ""}}))
+        # Albums first, so a crash in between leaves tracks queued rather than dequeued without art.
+        if albums:
+            await self._albums.bulk_write(
+                [UpdateOne({"_id": key}, {"$set": fields}, upsert=True) for key, fields in albums.items()], ordered=False
+            )
+        if track_requests:
+            await self._tracks.bulk_write(track_requests, ordered=False)
+        for key in albums:
+            self._dimension_cache.discard((self._albums.name, key))
+        for key in checked:
+            self._dimension_cache.discard((self._tracks.name, key))
+        return len(albums)
+
+    async def extract_dimensions(self, batch_size: int = 1000) -> int:
+        """
+        Migration: move the metadata older plays embed into the dimensions and rewrite those plays as
+        references, batch by batch in played_at order. Progress is checkpointed, so it can be re-run.
+        """
+        state = await self._state.find_one({"_id": DIMENSIONS_MIGRATION_KEY}) or {}
+        query: Dict[str, Any] = {"$or": [{f"track.{field}": {"$exists": True}} for field in LEGACY_TRACK_FIELDS]}
+        rewritten = 0
+        while True:
+            if state.get("last_id"):
+                query["_id"] = {"$gt": state["last_id"]}
+            batch = await self._collection.find(query).sort("_id", 1).limit(batch_size).to_list(length=None)
+            if not batch:
+                break
+            await self._save_dimensions(batch)
+            await self._collection.bulk_write([_reference_update(doc) for doc in batch], ordered=False)
+            rewritten += len(batch)
+            state = {"last_id": batch[-1]["_id"]}
+            await self._state.update_one(
+                {"_id": DIMENSIONS_MIGRATION_KEY},
+                {"$set": {**state, "updated_at": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+        return rewritten
+
+    async def migrate_to_v2(self, batch_size: int = 1000) -> int:
+        """
+        Migration: rewrite v1 plays as compact v2 documents, batch by batch. Each batch is inserted
+        before its v1 originals are deleted, so an interrupted run repeats at most one batch (the
+        v2 copies are then skipped as duplicates). Drops the legacy played_at index once done.
+        """
+        state = await self._state.find_one({"_id": V2_MIGRATION_KEY}) or {}
+        if state.get("completed"):
+            return 0
+        converted = 0
+        while True:
+            query: Dict[str, Any] = {"_id": {"$gt": state["last_id"]} if state.get("last_id") else {"$gte": ""}}
+            batch = await self._collection.find(query).sort("_id", 1).limit(batch_size).to_list(length=None)
+            if not batch:
+                break
+            embedded = [doc for doc in batch if _embeds_metadata(doc)]
+            if embedded:
+                await self._save_dimensions(embedded)
+            await self._insert_documents([_v2_from_v1(doc) for doc in batch])
+            await self._collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+            converted += len(batch)
+            state = {"last_id": batch[-1]["_id"]}
+            await self._state.update_one(
+                {"_id": V2_MIGRATION_KEY}, {"$set": {**state, "updated_at": datetime.now(timezone.utc)}}, upsert=True
+            )
+        self._legacy_plays = await self._has_legacy_plays()
+        if not self._legacy_plays:
+            try:
+                await self._collection.drop_index("played_at_1")
+            except OperationFailure:
+                pass
+        return converted
+
+    async def get_recent_high_water(self) -> Optional[datetime]:
+        """
+        Newest played_at the recent-plays ingester has stored; falls back to the newest stored play.
+        """
+        state = await self._state.find_one({"_id": RECENT_HIGH_WATER_KEY})
+        if state and state.get("played_at"):
+            return _as_utc(state["played_at"])
+        # Dates sort after strings, so this is the newest v2 play whenever one exists.
+        candidates = [await self._collection.find_one({}, projection={"_id": 1, "played_at": 1}, sort=[("_id", -1)])]
+        if self._legacy_plays:
+            candidates.append(
+                await self._collection.find_one(
+                    {"played_at": {"$exists": True}}, projection={"played_at": 1}, sort=[("played_at", -1)]
+                )
+            )
+        return max((_played_at(doc) for doc in candidates if doc), default=None)
+
+    async def save_recent_high_water(self, played_at: datetime) -> None:
+        await self._state.update_one(
+            {"_id": RECENT_HIGH_WATER_KEY},
+            {"$max": {"played_at": played_at}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
 
-    async def update_album_images(self, track_id: str, images: List[Dict[str, Any]]) -> None:
-        await self._collection.update_many(
-            {"track.id": track_id},
-            {"$set": {"track.album.images": images}},
+    async def save_ingest_heartbeat(self, name: str, next_run_at: datetime) -> None:
+        await self._state.update_one(
+            {"_id": INGEST_HEARTBEAT_PREFIX + name},
+            {"$set": {"next_run_at": next_run_at, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
         )
 
+    async def clear_ingest_heartbeat(self, name: str) -> None:
+        await self._state.delete_one({"_id": INGEST_HEARTBEAT_PREFIX + name})
+
+    async def running_schedulers(self) -> List[str]:
+        """
+        Names of ingestion schedulers whose announced next poll is at most INGEST_HEARTBEAT_GRACE_SECONDS
+        overdue, i.e. that are presumably still running.
+        """
+        alive_after = datetime.now(timezone.utc) - timedelta(seconds=INGEST_HEARTBEAT_GRACE_SECONDS)
+        cursor = self._state.find(
+            {"_id": {"$regex": f"^{INGEST_HEARTBEAT_PREFIX}"}, "next_run_at": {"$gt": alive_after}}, projection={"_id": 1}
+        )
+        return [doc["_id"][len(INGEST_HEARTBEAT_PREFIX) :] async for doc in cursor]
+
+    async def get_import_checkpoints(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        cursor = self._state.find({"_id": {"$in": keys}})
+        return {doc["_id"]: doc async for doc in cursor}
+
+    async def find_import_checkpoints(self, fingerprints: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        # Checkpoints recorded for files whose fingerprint (path, size, mtime) is unchanged since.
+        cursor = self._state.find({"fingerprint": {"$in": fingerprints}})
+        return {doc["_id"]: doc async for doc in cursor}
+
+    async def save_import_checkpoint(
+        self, key: str, source: str, rows_committed: int, completed: bool, fingerprint: Optional[Dict[str, Any]] = None
+    ) -> None:
+        # $max so a slower concurrent writer can never move the checkpoint backwards.
+        update: Dict[str, Any] = {
+            "$max": {"rows_committed": rows_committed},
+            "$set": {"source": source, "updated_at": datetime.now(timezone.utc)},
+        }
+        if fingerprint:
+            update["$set"]["fingerprint"] = fingerprint
+        if completed:
+            update["$set"]["completed"] = True
+        await self._state.update_one({"_id": key}, update, upsert=True)
+
     @staticmethod
     def _to_document(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         track = item.get("track") or {}
@@ -76,33 +820,437 @@ class PlaybackStore:
         if not track or not played_at:
             return None
 
-        played_dt = _coerce_utc_datetime(played_at)
-        album = track.get("album") or {}
-
-        return {
-            "_id": played_dt.isoformat(),
-            "played_at": played_dt,
-            "played_at_iso": played_dt.isoformat(),
-            "track": {
-                "id": track.get("id"),
-                "name": track.get("name"),
-                "duration_ms": track.get("duration_ms"),
-                "artists": [artist.get("name") for artist in track.get("artists", []) if artist.get("name")],
-                "album": {
-                    "id": album.get("id"),
-                    "name": album.get("name"),
-                    "images": album.get("images", []),
-                },
-                "popularity": track.get("popularity"),
-                "external_urls": track.get("external_urls"),
-                "explicit": track.get("explicit"),
-            },
-            "context": item.get("context"),
-        }
+        artists = [artist.get("name") for artist in track.get("artists", []) if artist.get("name")]
+        return _compact_play(
+            coerce_utc_datetime(played_at),
+            track_id=track.get("id"),
+            name=track.get("name"),
+            duration_ms=track.get("duration_ms"),
+            artists=artists,
+            album_key=analytics.album_key(track.get("album") or {}, artists),
+            context_uri=(item.get("context") or {}).get("uri"),
+        )
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Motor hands back naive UTC datetimes unless the client is tz_aware.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
 
 
-def _coerce_utc_datetime(value: str) -> datetime:
+def coerce_utc_datetime(value: str) -> datetime:
+    """
+    Parse a Spotify ISO timestamp ("...Z", an offset, or none at all) into an aware UTC datetime.
+    """
     dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
     if dt.tzinfo:
         return dt.astimezone(timezone.utc)
     return dt.replace(tzinfo=timezone.utc)
+
+
+def _compact_play(
+    played_at: datetime,
+    track_id: Optional[str],
+    name: Optional[str],
+    duration_ms: Optional[int],
+    artists: List[str],
+    album_key: Optional[str],
+    context_uri: Optional[str],
+) -> Dict[str, Any]:
+    doc: Dict[str, Any] = {"_id": played_at, "v": SCHEMA_VERSION, "d": duration_ms, "a": artists}
+    if track_id:
+        doc["t"] = track_id
+    else:
+        # No track dimension to point at; the name is the only way to tell these plays apart.
+        doc["n"] = name
+    if album_key:
+        doc["al"] = album_key
+    if context_uri:
+        doc["c"] = context_uri
+    return doc
+
+
+def _embeds_metadata(doc: Dict[str, Any]) -> bool:
+    return any(field in (doc.get("track") or {}) for field in LEGACY_TRACK_FIELDS)
+
+
+def _v2_from_v1(doc: Dict[str, Any]) -> Dict[str, Any]:
+    track = doc.get("track") or {}
+    return _compact_play(
+        _as_utc(doc["played_at"]),
+        track_id=track.get("id"),
+        name=track.get("name"),
+        duration_ms=track.get("duration_ms"),
+        artists=track.get("artists", []),
+        album_key=_stored_album_key(track),
+        context_uri=(doc.get("context") or {}).get("uri"),
+    )
+
+
+def _played_at(doc: Dict[str, Any]) -> datetime:
+    return _as_utc(doc["played_at"] if "played_at" in doc else doc["_id"])
+
+
+def _as_v1(doc: Dict[str, Any]) -> Dict[str, Any]:
+    # v2 plays in the v1 reference shape (track.id/name/duration_ms/artists/album_key) for readers.
+    # played_at is UTC-aware either way; the driver hands v1 timestamps back naive.
+    if doc.get("v") != SCHEMA_VERSION:
+        return {**doc, "played_at": _as_utc(doc["played_at"])} if doc.get("played_at") else doc
+    track = {"id": doc.get("t"), "duration_ms": doc.get("d"), "artists": doc.get("a", [])}
+    if doc.get("n"):
+        track["name"] = doc["n"]
+    if doc.get("al"):
+        track["album_key"] = doc["al"]
+    return {
+        "_id": doc["_id"],
+        "played_at": _as_utc(doc["_id"]),
+        "track": track,
+        "context": {"uri": doc["c"]} if doc.get("c") else None,
+    }
+
+
+def _play_projection(fields: Optional[Iterable[str]], legacy: bool = False) -> Optional[Dict[str, int]]:
+    if fields is None:
+        return None
+    if not legacy:
+        # "v" tells _as_v1 the play is compact.
+        return {field: 1 for field in ("v", *fields)}
+    return {path: 1 for field in fields for path in ("played_at", *V1_FIELDS[field])}
+
+
+async def _merge_by_played_at(cursors: List[Any]) -> AsyncIterator[Dict[str, Any]]:
+    # Each cursor is already in played_at order; v1 and v2 plays interleave when an old export
+    # was imported after the upgrade, so the streams are merged rather than concatenated.
+    streams = [cursor.__aiter__() for cursor in cursors]
+    heads = []
+    for index, stream in enumerate(streams):
+        doc = await _next_or_none(stream)
+        if doc is not None:
+            heads.append((_played_at(doc), index, doc))
+    heapq.heapify(heads)
+    while heads:
+        _, index, doc = heads[0]
+        yield doc
+        following = await _next_or_none(streams[index])
+        if following is None:
+            heapq.heappop(heads)
+        else:
+            heapq.heapreplace(heads, (_played_at(following), index, following))
+
+
+async def _next_or_none(stream: Any) -> Optional[Dict[str, Any]]:
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+def _epoch_ms(value: datetime) -> int:
+    return int(_as_utc(value).timestamp() * 1000)
+
+
+def _without_none(fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in fields.items() if value is not None}
+
+
+def _track_id(play: Dict[str, Any]) -> Optional[str]:
+    return (play.get("track") or {}).get("id")
+
+
+def _stored_album_key(track: Dict[str, Any]) -> Optional[str]:
+    # Grouping key recorded on the play; older plays still embed the album itself.
+    return track.get("album_key") or analytics.album_key(track.get("album") or {}, track.get("artists", []))
+
+
+def _hydrate_track(
+    track: Dict[str, Any], tracks: Dict[str, Dict[str, Any]], albums: Dict[str, Dict[str, Any]], full: bool = True
+) -> Dict[str, Any]:
+    # Back to the shape plays were originally stored in; dimension values win over embedded ones.
+    # Without full, only what the summaries read (popularity and links are left out). The album is
+    # the one the play recorded, never the track's current link, so every engine groups alike.
+    dimension = tracks.get(track.get("id")) or {}
+    embedded_album = track.get("album") or {}
+    album = albums.get(_stored_album_key(track)) or {}
+    hydrated = {
+        "id": track.get("id"),
+        "name": dimension.get("name") or track.get("name"),
+        "duration_ms": track.get("duration_ms"),
+        "artists": track.get("artists", []),
+        "album": {
+            "id": _stored_album_key(track),
+            "name": album.get("name") or embedded_album.get("name"),
+            "images": album.get("images") or embedded_album.get("images", []),
+        },
+    }
+    if full:
+        hydrated["popularity"] = dimension.get("popularity", track.get("popularity"))
+        hydrated["external_urls"] = dimension.get("external_urls", track.get("external_urls"))
+        hydrated["explicit"] = dimension.get("explicit", track.get("explicit"))
+    return hydrated
+
+
+def _reference_update(doc: Dict[str, Any]) -> UpdateOne:
+    track = doc.get("track") or {}
+    update: Dict[str, Any] = {"$unset": {f"track.{field}": "" for field in LEGACY_TRACK_FIELDS}}
+    update["$unset"]["needs_images"] = ""
+    if track.get("id"):
+        update["$unset"]["track.name"] = ""
+    album_key = _stored_album_key(track)
+    if album_key:
+        update["$set"] = {"track.album_key": album_key}
+    return UpdateOne({"_id": doc["_id"]}, update)
+
+
+def _summary_pipeline(match: Dict[str, Any], limit: int, sort_by_id: bool = False) -> List[Dict[str, Any]]:
+    # Mirrors summarize_month_from_plays: plays are walked in played_at order so $first/$last
+    # match Counter insertion order (ties) and last-seen metadata respectively. Embedded metadata
+    # only exists on older plays; the store fills in the rest from the dimensions afterwards.
+    # Fields are read from either schema version; with only v2 plays left, _id order is played_at order.
+    has_track = {"track_key": {"$ne": None}}
+    first_seen = {"$first": "$played_at"}
+    rank = {"$sort": {"play_count": -1, "first_seen": 1}}
+
+    def _unique(key: str) -> List[Dict[str, Any]]:
+        return [{"$match": has_track}, {"$group": {"_id": key}}, {"$count": "count"}]
+
+    played_at = {"$ifNull": ["$played_at", "$_id"]}
+    # analytics.album_key for older plays that embed a name-only album: "name|first artist".
+    legacy_artists = {"$ifNull": ["$track.artists", []]}
+    legacy_album_name = {
+        "$cond": [
+            {"$gt": [{"$size": legacy_artists}, 0]},
+            {"$concat": ["$track.album.name", "|", {"$arrayElemAt": [legacy_artists, 0]}]},
+            "$track.album.name",
+        ]
+    }
+    ordering = [{"$sort": {"_id": 1}}] if sort_by_id else []
+    return [
+        {"$match": match},
+        *ordering,
+        {
+            "$project": {
+                "_id": 0,
+                "played_at": played_at,
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": played_at}},
+                "track_key": _first_truthy("$t", "$n", "$track.id", "$track.name"),
+                "album_ref": _first_truthy("$al", "$track.album_key", "$track.album.id", legacy_album_name),
+                "duration": {"$ifNull": ["$d", {"$ifNull": ["$track.duration_ms", 0]}]},
+                "name": {"$ifNull": ["$n", "$track.name"]},
+                "artists": {"$ifNull": ["$a", {"$ifNull": ["$track.artists", []]}]},
+                "album_name": "$track.album.name",
+                "images": {"$ifNull": ["$track.album.images", []]},
+            }
+        },
+        *([] if sort_by_id else [{"$sort": {"played_at": 1}}]),
+        {"$addFields": {"album_key": {"$ifNull": ["$album_ref", "$track_key"]}}},
+        {
+            "$facet": {
+                "totals": [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "documents": {"$sum": 1},
+                            "play_count": {"$sum": {"$cond": [{"$ne": ["$track_key", None]}, 1, 0]}},
+                            "duration": {"$sum": {"$cond": [{"$ne": ["$track_key", None]}, "$duration", 0]}},
+                            "days": {"$addToSet": "$day"},
+                        }
+                    },
+                    {"$project": {"_id": 0, "documents": 1, "play_count": 1, "duration": 1, "days_active": {"$size": "$days"}}},
+                ],
+                "unique_tracks": _unique("$track_key"),
+                "unique_albums": _unique("$album_key"),
+                "unique_artists": [{"$match": has_track}, {"$unwind": "$artists"}, {"$group": {"_id": "$artists"}}, {"$count": "count"}],
+                "top_tracks": [
+                    {"$match": has_track},
+                    {
+                        "$group": {
+                            "_id": "$track_key",
+                            "play_count": {"$sum": 1},
+                            "duration": {"$sum": "$duration"},
+                            "first_seen": first_seen,
+                            "name": {"$last": "$name"},
+                            "artists": {"$last": "$artists"},
+                            "album_ref": {"$last": "$album_ref"},
+                            "album_name": {"$last": "$album_name"},
+                            "images": {"$last": "$images"},
+                        }
+                    },
+                    rank,
+                    {"$limit": limit},
+                ],
+                "top_albums": [
+                    {"$match": has_track},
+                    {
+                        "$group": {
+                            "_id": "$album_key",
+                            "play_count": {"$sum": 1},
+                            "duration": {"$sum": "$duration"},
+                            "first_seen": first_seen,
+                            "track_key": {"$last": "$track_key"},
+                            "album_ref": {"$last": "$album_ref"},
+                            "album_name": {"$last": "$album_name"},
+                            "artists": {"$last": "$artists"},
+                            "images": {"$last": "$images"},
+                        }
+                    },
+                    rank,
+                    {"$limit": limit},
+                ],
+                "top_artists": [
+                    {"$match": has_track},
+                    {"$unwind": {"path": "$artists", "includeArrayIndex": "position"}},
+                    {
+                        "$group": {
+                            "_id": "$artists",
+                            "play_count": {"$sum": 1},
+                            "duration": {"$sum": "$duration"},
+                            "first_seen": {"$first": {"played_at": "$played_at", "position": "$position"}},
+                        }
+                    },
+                    {"$sort": {"play_count": -1, "first_seen.played_at": 1, "first_seen.position": 1}},
+                    {"$limit": limit},
+                ],
+            }
+        },
+    ]
+
+
+def _rollup_periods(start: datetime, end: datetime) -> List[str]:
+    """
+    Rollup periods exactly covering [start, end): "YYYY-MM" for whole months and "YYYY-MM-DD" for the
+    days around them. [] unless both ends fall on UTC midnight.
+    """
+    start, end = _as_utc(start), _as_utc(end)
+    if any(dt.time() != datetime.min.time() for dt in (start, end)):
+        return []
+    periods = []
+    cursor = start
+    while cursor < end:
+        next_month = (cursor + timedelta(days=32)).replace(day=1)
+        if cursor.day == 1 and next_month <= end:
+            periods.append(cursor.strftime("%Y-%m"))
+            cursor = next_month
+        else:
+            periods.append(cursor.strftime("%Y-%m-%d"))
+            cursor += timedelta(days=1)
+    return periods
+
+
+def _rollup_increments(plays: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fold plays (v1 reference shape) into rollup rows keyed "<period>|<kind>|<key>", once for the
+    month and once for the day. Counts mirror summarize_month_from_plays; f is the first sighting
+    (played_at, artist position) for tie-breaks and l the last one, carrying the metadata the
+    summary reports for that row.
+    """
+    rows: Dict[str, Dict[str, Any]] = {}
+
+    def bump(period: str, kind: str, key: str, **values: Any) -> None:
+        row = rows.setdefault(f"{period}|{kind}|{key}", {"p": period, "k": kind, "key": key, "c": 0, "d": 0, "n": 0})
+        for field in ("c", "d", "n"):
+            row[field] += values.get(field, 0)
+        first, last = values.get("f"), values.get("l")
+        if first and (not row.get("f") or (first["at"], first["pos"]) < (row["f"]["at"], row["f"]["pos"])):
+            row["f"] = first
+        if last and (not row.get("l") or last["at"] > row["l"]["at"]):
+            row["l"] = last
+
+    for play in plays:
+        played_at = _played_at(play)
+        day = played_at.strftime("%Y-%m-%d")
+        track = play.get("track") or {}
+        track_key = track.get("id") or track.get("name")
+        duration = track.get("duration_ms") or 0
+        artists = track.get("artists", [])
+        album_ref = _stored_album_key(track)
+        first = {"at": played_at, "pos": 0}
+        for period in (played_at.strftime("%Y-%m"), day):
+            bump(period, "day", day, c=1)
+            if not track_key:
+                bump(period, "total", "", n=1)
+                continue
+            bump(period, "total", "", c=1, d=duration, n=1)
+            bump(
+                period, "track", track_key, c=1, d=duration, f=first,
+                l=_without_none({"at": played_at, "a": artists, "r": album_ref, "n": None if track.get("id") else track.get("name")}),
+            )
+            bump(
+                period, "album", album_ref or track_key, c=1, d=duration, f=first,
+                l=_without_none({"at": played_at, "a": artists, "r": album_ref, "t": track_key}),
+            )
+            for position, artist in enumerate(artists):
+                bump(period, "artist", artist, c=1, d=duration, f={"at": played_at, "pos": position})
+    return rows
+
+
+def _rollup_pipeline(periods: List[str], limit: int) -> List[Dict[str, Any]]:
+    def _top(kind: str) -> List[Dict[str, Any]]:
+        return [{"$match": {"_id.k": kind}}, {"$sort": {"c": -1, "f": 1}}, {"$limit": limit}]
+
+    return [
+        {"$match": {"p": {"$in": periods}}},
+        {
+            "$group": {
+                "_id": {"k": "$k", "key": "$key"},
+                "c": {"$sum": "$c"},
+                "d": {"$sum": "$d"},
+                "n": {"$sum": "$n"},
+                "f": {"$min": "$f"},
+                "l": {"$max": "$l"},
+            }
+        },
+        {
+            "$facet": {
+                "totals": [{"$match": {"_id.k": "total"}}],
+                "counts": [{"$group": {"_id": "$_id.k", "count": {"$sum": 1}}}],
+                "top_tracks": _top("track"),
+                "top_albums": _top("album"),
+                "top_artists": _top("artist"),
+            }
+        },
+    ]
+
+
+def _rollup_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    # Rollup facets in the shape _summary_pipeline produces, so both share the same finishing steps.
+    totals = (result.get("totals") or [{}])[0]
+    counts = {row["_id"]: row["count"] for row in result.get("counts") or []}
+
+    def _rows(facet: str) -> List[Dict[str, Any]]:
+        rows = []
+        for row in result.get(facet) or []:
+            last = row.get("l") or {}
+            rows.append(
+                {
+                    "_id": row["_id"]["key"],
+                    "play_count": row["c"],
+                    "duration": row["d"],
+                    "name": last.get("n"),
+                    "artists": last.get("a", []),
+                    "album_ref": last.get("r"),
+                    "track_key": last.get("t"),
+                }
+            )
+        return rows
+
+    return {
+        "totals": [
+            {
+                "documents": totals.get("n", 0),
+                "play_count": totals.get("c", 0),
+                "duration": totals.get("d", 0),
+                "days_active": counts.get("day", 0),
+            }
+        ],
+        **{f"unique_{kind}s": [{"count": counts.get(kind, 0)}] for kind in ("track", "album", "artist")},
+        "top_tracks": _rows("top_tracks"),
+        "top_albums": _rows("top_albums"),
+        "top_artists": _rows("top_artists"),
+    }
+
+
+def _first_truthy(*paths: Any) -> Dict[str, Any]:
+    # Python's `a or b` for string fields: skip missing, null and empty values.
+    expr: Any = None
+    for path in reversed(paths):
+        expr = {"$cond": [{"$ne": [{"$ifNull": [path, ""]}, ""]}, path, expr]}
+    return expr
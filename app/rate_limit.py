@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Client-side request budget: `rate` tokens per second, bursting up to `capacity`.
+    pause() blocks every caller until a server-imposed cool-down (Retry-After) has passed.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = max(rate, 0.001)
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # The lock keeps waiters in FIFO order so a burst drains at `rate` instead of stampeding.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        # Refill starts when the pause ends, so waiters resume at `rate` rather than in a burst.
+        self._tokens = 0
+        self._updated = self._paused_until
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD in-flight limit: halves on throttling, grows by one after a full window of successes.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 16) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self) -> "AdaptiveConcurrency":
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.maximum:
+            self.limit += 1
+            self._successes = 0
+
+    def on_throttle(self) -> None:
+        self.limit = max(self.minimum, self.limit // 2)
+        self._successes = 0
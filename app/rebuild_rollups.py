@@ -0,0 +1,60 @@
+import asyncio
+import logging
+
+from app.config import get_settings
+from app.playback_store import PlaybackStore
+
+
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_rollups(batch_size: int = 5000) -> None:
+    """
+    Recount the monthly rollups from every stored play. Needed once after upgrading (until then the
+    period endpoints read raw plays) or if the rollups are ever suspected to have drifted.
+    """
+    settings = get_settings()
+    if not settings.mongo_uri:
+        raise ValueError("MONGODB_URI is required to rebuild rollups.")
+
+    store = PlaybackStore.from_settings(settings)
+    try:
+        await store.ensure_indexes()
+        counted = await store.rebuild_rollups(batch_size=batch_size)
+        logger.info("Rebuilt rollups from %s plays", counted)
+    finally:
+        await store.close()
+
+
+async def check_rollups() -> bool:
+    """
+    Compare the rollup totals with the stored plays without changing anything. Run with ingestion
+    paused; a mismatch means a writer died between inserting plays and counting them.
+    """
+    settings = get_settings()
+    if not settings.mongo_uri:
+        raise ValueError("MONGODB_URI is required to check rollups.")
+
+    store = PlaybackStore.from_settings(settings)
+    try:
+        counts = await store.check_rollups()
+    finally:
+        await store.close()
+    if counts["plays"] != counts["rolled_up"]:
+        logger.warning("Rollups count %s plays but %s are stored; rebuild them", counts["rolled_up"], counts["plays"])
+        return False
+    logger.info("Rollups match the %s stored plays", counts["plays"])
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Rebuild the monthly rollups from stored plays.")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Plays folded per bulk write.")
+    parser.add_argument("--check", action="store_true", help="Only compare rollup totals with stored plays; exit 1 on a mismatch.")
+    args = parser.parse_args()
+    if args.check:
+        raise SystemExit(0 if asyncio.run(check_rollups()) else 1)
+    asyncio.run(rebuild_rollups(batch_size=args.batch_size))
@@ -1,6 +1,8 @@
-from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Literal, Optional, Tuple
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Dict, List, Literal, Optional, Tuple
 
+import httpx
 from fastapi import APIRouter, Depends, HTTPException, Query
 
 from app import analytics
@@ -13,6 +15,13 @@ router = APIRouter(prefix="/wrapped", tags=["wrapped"])
 
 TimeRange = Literal["short_term", "medium_term", "long_term"]
 
+DEADLINE_QUERY = Query(
+    None,
+    ge=100,
+    le=60000,
+    description="Optional budget in ms; sections still loading at the deadline are returned as null and listed in `missing`.",
+)
+
 
 @router.get("/short")
 async def short_term(
@@ -20,62 +29,141 @@ async def short_term(
     recent_limit: int = Query(
         50, ge=1, le=50, description="Recently played sample (Spotify exposes ~last 50 plays only)"
     ),
+    deadline_ms: Optional[int] = DEADLINE_QUERY,
     client: SpotifyClient = Depends(get_spotify_client),
 ) -> Dict:
     """
     Short-term view (~4 weeks): top tracks, top artists, plus the small recent playback window Spotify exposes.
     """
-    profile = await client.get_user_profile()
-    top_tracks = await client.get_top_tracks(time_range="short_term", max_items=top_limit)
-    top_artists = await client.get_top_artists(time_range="short_term", max_items=top_limit)
-    recent_items = await client.get_recently_played(max_items=recent_limit)
+    sections, missing = await _fetch_sections(
+        {
+            "profile": client.get_user_profile(),
+            "top_tracks": client.get_top_tracks(time_range="short_term", max_items=top_limit),
+            "top_artists": client.get_top_artists(time_range="short_term", max_items=top_limit),
+            "recent": client.get_recently_played(max_items=recent_limit),
+        },
+        deadline_ms,
+    )
 
     return {
         "time_range": "short_term",
-        "user": {"id": profile.get("id"), "display_name": profile.get("display_name")},
-        "top_tracks": analytics.summarize_top_tracks(top_tracks, audio_features={}),
-        "top_artists": analytics.summarize_top_artists(top_artists),
-        "recent": _summarize_recent(recent_items),
+        **_top_sections(sections),
+        "recent": _summarize_recent(sections["recent"]) if "recent" in sections else None,
+        **({"missing": missing} if deadline_ms else {}),
     }
 
 
 @router.get("/medium")
 async def medium_term(
     top_limit: int = Query(50, ge=1, le=50, description="Top tracks/artists (Spotify caps at 50)"),
+    deadline_ms: Optional[int] = DEADLINE_QUERY,
     client: SpotifyClient = Depends(get_spotify_client),
 ) -> Dict:
     """
     Medium-term view (~6 months): top tracks and artists.
     """
-    profile = await client.get_user_profile()
-    top_tracks = await client.get_top_tracks(time_range="medium_term", max_items=top_limit)
-    top_artists = await client.get_top_artists(time_range="medium_term", max_items=top_limit)
+    sections, missing = await _fetch_sections(
+        {
+            "profile": client.get_user_profile(),
+            "top_tracks": client.get_top_tracks(time_range="medium_term", max_items=top_limit),
+            "top_artists": client.get_top_artists(time_range="medium_term", max_items=top_limit),
+        },
+        deadline_ms,
+    )
 
     return {
         "time_range": "medium_term",
-        "user": {"id": profile.get("id"), "display_name": profile.get("display_name")},
-        "top_tracks": analytics.summarize_top_tracks(top_tracks, audio_features={}),
-        "top_artists": analytics.summarize_top_artists(top_artists),
+        **_top_sections(sections),
+        **({"missing": missing} if deadline_ms else {}),
     }
 
 
 @router.get("/long")
 async def long_term(
     top_limit: int = Query(50, ge=1, le=50, description="Top tracks/artists (Spotify caps at 50)"),
+    deadline_ms: Optional[int] = DEADLINE_QUERY,
     client: SpotifyClient = Depends(get_spotify_client),
 ) -> Dict:
     """
     Long-term view (multi-year): top tracks and artists.
     """
-    profile = await client.get_user_profile()
-    top_tracks = await client.get_top_tracks(time_range="long_term", max_items=top_limit)
-    top_artists = await client.get_top_artists(time_range="long_term", max_items=top_limit)
+    sections, missing = await _fetch_sections(
+        {
+            "profile": client.get_user_profile(),
+            "top_tracks": client.get_top_tracks(time_range="long_term", max_items=top_limit),
+            "top_artists": client.get_top_artists(time_range="long_term", max_items=top_limit),
+        },
+        deadline_ms,
+    )
 
     return {
         "time_range": "long_term",
-        "user": {"id": profile.get("id"), "display_name": profile.get("display_name")},
-        "top_tracks": analytics.summarize_top_tracks(top_tracks, audio_features={}),
-        "top_artists": analytics.summarize_top_artists(top_artists),
+        **_top_sections(sections),
+        **({"missing": missing} if deadline_ms else {}),
+    }
+
+
+async def _fetch_sections(
+    calls: Dict[str, Awaitable[Any]], deadline_ms: Optional[int]
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Run independent Spotify calls concurrently. The first failure cancels the rest and maps to an HTTP error;
+    with a deadline, whatever finished in time is returned along with the names of the sections that did not.
+    """
+    tasks = {name: asyncio.ensure_future(call) for name, call in calls.items()}
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + deadline_ms / 1000 if deadline_ms else None
+    pending = set(tasks.values())
+    try:
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                exc = task.exception()
+                if exc is None:
+                    continue
+                mapped = _upstream_error(exc)
+                if mapped is None:
+                    raise exc
+                raise mapped from exc
+            if not done:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+
+    sections = {name: task.result() for name, task in tasks.items() if task.done() and not task.cancelled()}
+    missing = [name for name in tasks if name not in sections]
+    return sections, missing
+
+
+def _upstream_error(exc: BaseException) -> Optional[HTTPException]:
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        if status == 429:
+            retry_after = exc.response.headers.get("Retry-After")
+            headers = {"Retry-After": retry_after} if retry_after else None
+            return HTTPException(status_code=429, detail="Spotify rate limit reached; retry later.", headers=headers)
+        if status == 404:
+            return HTTPException(status_code=404, detail="Spotify resource not found.")
+        if status in (401, 403):
+            return HTTPException(status_code=502, detail="Spotify rejected the configured credentials.")
+        return HTTPException(status_code=502, detail=f"Spotify API error ({status}).")
+    if isinstance(exc, httpx.TimeoutException):
+        return HTTPException(status_code=504, detail="Timed out waiting for Spotify.")
+    if isinstance(exc, httpx.RequestError):
+        return HTTPException(status_code=502, detail="Could not reach Spotify.")
+    return None
+
+
+def _top_sections(sections: Dict[str, Any]) -> Dict[str, Any]:
+    profile = sections.get("profile")
+    top_tracks = sections.get("top_tracks")
+    top_artists = sections.get("top_artists")
+    return {
+        "user": {"id": profile.get("id"), "display_name": profile.get("display_name")} if profile is not None else None,
+        "top_tracks": analytics.summarize_top_tracks(top_tracks, audio_features={}) if top_tracks is not None else None,
+        "top_artists": analytics.summarize_top_artists(top_artists) if top_artists is not None else None,
     }
 
 
@@ -113,11 +201,10 @@ async def monthly_wrapped(
     end = datetime(end_year, end_month, 1, tzinfo=timezone.utc)
 
     try:
-        plays = await store.fetch_between(start, end)
+        summary = await store.summarize_period(start, end, limit=limit)
     except ValueError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
-    summary = analytics.summarize_month_from_plays(plays, limit=limit)
     return {
         "year": target_year,
         "month": target_month,
@@ -142,11 +229,10 @@ async def yearly_wrapped(
     end = datetime(target_year + 1, 1, 1, tzinfo=timezone.utc)
 
     try:
-        plays = await store.fetch_between(start, end)
+        summary = await store.summarize_period(start, end, limit=limit)
     except ValueError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
-    summary = analytics.summarize_month_from_plays(plays, limit=limit)
     return {
         "year": target_year,
         "start": start.isoformat(),
@@ -155,6 +241,41 @@ async def yearly_wrapped(
     }
 
 
+@router.get("/range")
+async def range_wrapped(
+    start: Optional[date] = Query(None, description="First day included (UTC). Defaults to the first stored play."),
+    end: Optional[date] = Query(None, description="First day excluded (UTC). Defaults to tomorrow, i.e. through today."),
+    limit: int = Query(20, ge=1, le=50, description="How many top tracks/artists/albums to include."),
+    store: PlaybackStore = Depends(get_playback_store),
+) -> Dict:
+    """
+    Wrapped-style view backed by stored plays in MongoDB for any span of days (last 90 days,
+    a custom quarter, all time). Served from the monthly and daily rollups.
+    """
+    end_day = end or (datetime.now(timezone.utc) + timedelta(days=1)).date()
+    end_dt = datetime(end_day.year, end_day.month, end_day.day, tzinfo=timezone.utc)
+    if start:
+        start_dt = datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
+    else:
+        first = await store.first_played_at()
+        # An end before the first play is an empty range, not a reversed one.
+        start_dt = min(first.replace(hour=0, minute=0, second=0, microsecond=0), end_dt) if first else end_dt
+    if start_dt > end_dt:
+        raise HTTPException(status_code=400, detail="start must not be after end.")
+
+    try:
+        summary = await store.summarize_period(start_dt, end_dt, limit=limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+    return {
+        "start": start_dt.isoformat(),
+        "end": end_dt.isoformat(),
+        "days": (end_dt - start_dt).days,
+        **summary,
+    }
+
+
 def _resolve_month_year(year: Optional[int], month: Optional[int]) -> Tuple[int, int]:
     now = datetime.now(timezone.utc)
     start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
@@ -1,11 +1,15 @@
+import asyncio
 import base64
+import random
 import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import httpx
 
+from app.cache import TTLCache
 from app.config import Settings
+from app.rate_limit import AdaptiveConcurrency, TokenBucket
 
 
 class SpotifyClient:
@@ -13,7 +17,30 @@ class SpotifyClient:
         self.settings = settings
         self._access_token: Optional[str] = None
         self._token_expires_at: float = 0
-        self._http = httpx.AsyncClient(timeout=self.settings.request_timeout)
+        self._refresh_task: Optional[asyncio.Task] = None
+        # One keep-alive pool per client; the API shares a single client per process (see app.main).
+        limits = httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        )
+        self._http = httpx.AsyncClient(timeout=self.settings.request_timeout, limits=limits, http2=settings.http2)
+        self._bucket = TokenBucket(settings.spotify_rate_limit, settings.spotify_rate_burst)
+        self._concurrency = AdaptiveConcurrency(
+            initial=settings.spotify_max_concurrency,
+            minimum=1,
+            maximum=settings.spotify_max_concurrency,
+        )
+        self._counters = {"requests": 0, "throttled": 0, "server_errors": 0, "retried": 0}
+        self._cache = TTLCache(max_entries=settings.spotify_cache_max_entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "concurrency_limit": self._concurrency.limit,
+            "in_flight": self._concurrency.in_flight,
+            "cache": self._cache.stats(),
+        }
 
     async def close(self) -> None:
         await self._http.aclose()
@@ -30,49 +57,163 @@ class SpotifyClient:
         expires_in = payload.get("expires_in", 3600)
         self._token_expires_at = time.time() + expires_in - 60  # refresh slightly early
 
-    async def _ensure_token(self) -> None:
-        if not self._access_token or time.time() >= self._token_expires_at:
+    async def _ensure_token(self, stale_token: Optional[str] = None) -> str:
+        """
+        Return a valid access token. Concurrent callers share a single in-flight refresh (and its error).
+        Pass the token that was just rejected as stale_token to refresh only if nobody has replaced it yet.
+        """
+        if self._access_token and self._access_token != stale_token and time.time() < self._token_expires_at:
+            return self._access_token
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._run_refresh())
+        # Shielded so a cancelled caller does not abort the refresh the other waiters depend on.
+        await asyncio.shield(self._refresh_task)
+        return self._access_token
+
+    async def _run_refresh(self) -> None:
+        try:
             await self._refresh_access_token()
+        finally:
+            self._refresh_task = None
 
     async def _request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        await self._ensure_token()
-        headers = {"Authorization": f"Bearer {self._access_token}"}
+        response = await self._send(method, path, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def _cached_get(self, path: str, params: Optional[Dict[str, Any]], ttl: float) -> Dict[str, Any]:
+        """
+        GET through the response cache. Stale entries with an ETag are revalidated with If-None-Match,
+        so an unchanged resource costs a bodiless 304 instead of a full payload.
+        """
+        if ttl <= 0:
+            return await self._request("GET", path, params=params)
+
+        key = (path, tuple(sorted((params or {}).items())))
+        entry = self._cache.lookup(key)
+        if entry is not None and entry.fresh:
+            return entry.value
+
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else None
+        response = await self._send("GET", path, params=params, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self._cache.revalidated(key, ttl)
+            return entry.value
+        response.raise_for_status()
+        data = response.json()
+        self._cache.set(key, data, ttl, etag=response.headers.get("ETag"))
+        return data
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> httpx.Response:
+        """
+        Rate-limited request with retries: 429s wait out Retry-After, 5xx back off with jitter.
+        Returns the final response without raising so callers can inspect status and headers.
+        """
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            async with self._concurrency:
+                self._counters["requests"] += 1
+                response = await self._authorized_request(method, path, params, headers)
+                if response.status_code < 429:
+                    self._concurrency.on_success()
+                    return response
+
+                if response.status_code == 429:
+                    self._counters["throttled"] += 1
+                    self._concurrency.on_throttle()
+                    delay = _retry_after_seconds(response) or self._backoff(attempt)
+                    self._bucket.pause(delay)
+                elif response.status_code >= 500:
+                    self._counters["server_errors"] += 1
+                    delay = self._backoff(attempt)
+                else:
+                    return response
+
+            if attempt >= self.settings.spotify_max_retries or delay > self.settings.spotify_max_retry_wait:
+                return response
+            attempt += 1
+            self._counters["retried"] += 1
+            await asyncio.sleep(delay)
+
+    async def _authorized_request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]],
+        extra_headers: Optional[Dict[str, str]],
+    ) -> httpx.Response:
+        token = await self._ensure_token()
+        headers = {**(extra_headers or {}), "Authorization": f"Bearer {token}"}
         url = f"{self.settings.api_base}{path}"
         response = await self._http.request(method, url, headers=headers, params=params)
         if response.status_code == 401:
-            await self._refresh_access_token()
-            headers["Authorization"] = f"Bearer {self._access_token}"
+            token = await self._ensure_token(stale_token=token)
+            headers["Authorization"] = f"Bearer {token}"
             response = await self._http.request(method, url, headers=headers, params=params)
-        response.raise_for_status()
-        return response.json()
+        return response
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps parallel retries from lining up on the same instant.
+        ceiling = min(self.settings.spotify_max_retry_wait, self.settings.spotify_retry_backoff * 2**attempt)
+        return random.uniform(0, ceiling)
 
     async def _paginate(
-        self, path: str, params: Optional[Dict[str, Any]] = None, max_items: int = 150
+        self, path: str, params: Optional[Dict[str, Any]] = None, max_items: int = 150, cache_ttl: float = 0
     ) -> List[Dict[str, Any]]:
+        """
+        Fetch offset pages concurrently (bounded by spotify_page_concurrency) and stitch them back in order.
+        """
         params = params.copy() if params else {}
+        semaphore = asyncio.Semaphore(max(1, self.settings.spotify_page_concurrency))
+        known_total: Optional[int] = None
+
+        async def fetch_page(offset: int) -> Tuple[int, List[Dict[str, Any]]]:
+            nonlocal known_total
+            limit = min(50, max_items - offset)
+            async with semaphore:
+                # Pages queued behind the semaphore are skipped once a response has told us where the data ends.
+                if known_total is not None and offset >= known_total:
+                    return limit, []
+                data = await self._cached_get(path, {**params, "limit": limit, "offset": offset}, ttl=cache_ttl)
+            if isinstance(data.get("total"), int):
+                known_total = data["total"]
+            return limit, data.get("items", [])
+
+        tasks = [asyncio.create_task(fetch_page(offset)) for offset in range(0, max_items, 50)]
+        try:
+            pages = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
         results: List[Dict[str, Any]] = []
-        offset = 0
-        while len(results) < max_items:
-            limit = min(50, max_items - len(results))
-            page_params = {**params, "limit": limit, "offset": offset}
-            data = await self._request("GET", path, params=page_params)
-            items = data.get("items", [])
+        for limit, items in pages:
             results.extend(items)
             if len(items) < limit:
                 break
-            offset += limit
         return results
 
     async def get_user_profile(self) -> Dict[str, Any]:
-        return await self._request("GET", "/me")
+        return await self._cached_get("/me", None, ttl=self.settings.spotify_cache_ttl_profile)
 
     async def get_top_tracks(self, time_range: str = "long_term", max_items: int = 50) -> List[Dict[str, Any]]:
         params = {"time_range": time_range}
-        return await self._paginate("/me/top/tracks", params=params, max_items=max_items)
+        return await self._paginate(
+            "/me/top/tracks", params=params, max_items=max_items, cache_ttl=self.settings.spotify_cache_ttl_top
+        )
 
     async def get_top_artists(self, time_range: str = "long_term", max_items: int = 50) -> List[Dict[str, Any]]:
         params = {"time_range": time_range}
-        return await self._paginate("/me/top/artists", params=params, max_items=max_items)
+        return await self._paginate(
+            "/me/top/artists", params=params, max_items=max_items, cache_ttl=self.settings.spotify_cache_ttl_top
+        )
 
     async def get_recently_played(
         self,
@@ -97,7 +238,8 @@ class SpotifyClient:
             if not items:
                 break
             collected.extend(items)
-            if len(items) < params["limit"]:
+            # Spotify rejects after+before together, so an `after` query is a single page.
+            if len(items) < params["limit"] or after_ms:
                 break
             last_played = items[-1]["played_at"]
             next_before = self._played_at_to_ms(last_played) - 1
@@ -133,3 +275,11 @@ class SpotifyClient:
     def _played_at_to_ms(played_at: str) -> int:
         dt = datetime.fromisoformat(played_at.replace("Z", "+00:00"))
         return int(dt.timestamp() * 1000)
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
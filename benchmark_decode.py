@@ -0,0 +1,152 @@
+"""
+Decode cost of a year of stored plays on the period-summary path, without a MongoDB server.
+
+Encodes a synthetic year of plays to BSON in cursor-sized batches (what the driver receives),
+then times summarizing it the ways PlaybackStore could read it: every field, the SUMMARY_FIELDS
+projection, or RawBSONDocument. Plays are stored both as v2 and as unmigrated v1 documents (the
+ones that still embed popularity, links, context and album artwork). Allocations are the
+tracemalloc peak.
+Usage:
+    python benchmark_decode.py --plays 50000
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import bson
+from bson.codec_options import DEFAULT_CODEC_OPTIONS, CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+from app import analytics
+from app.playback_store import (
+    PLAY_BATCH_SIZE,
+    SUMMARY_FIELDS,
+    _as_v1,
+    _compact_play,
+    _hydrate_track,
+    _play_projection,
+)
+
+
+RAW_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+def build_year(plays: int, tracks: int = 3000, albums: int = 900) -> Dict[str, Any]:
+    random.seed(7)
+    start = datetime(2024, 1, 1)
+    step = timedelta(days=366) / plays
+    year: Dict[str, Any] = {"tracks": {}, "albums": {}, "v2": [], "v1": []}
+    for i in range(plays):
+        number = random.randrange(tracks)
+        played_at = start + step * i
+        track_id, album_key = f"{number:022d}", f"{number % albums:022d}"
+        artists = [f"Artist {number % 400}", f"Artist {number % 97}"]
+        album = {
+            "id": album_key,
+            "name": f"Album {number % albums}",
+            "images": [{"url": f"https://i.scdn.co/image/{album_key}{size}", "height": size, "width": size} for size in (640, 300, 64)],
+        }
+        context = f"spotify:playlist:{number % 50:022d}"
+        year["tracks"][track_id] = {"_id": track_id, "name": f"Song {number}", "album": album_key, "popularity": 50}
+        year["albums"][album_key] = {"_id": album_key, "name": album["name"], "images": album["images"]}
+        year["v2"].append(
+            _compact_play(played_at, track_id, None, 150_000 + number, artists, album_key, context)
+        )
+        year["v1"].append(
+            {
+                "_id": played_at.isoformat(),
+                "played_at": played_at,
+                "played_at_iso": played_at.isoformat(),
+                "track": {
+                    "id": track_id,
+                    "name": f"Song {number}",
+                    "duration_ms": 150_000 + number,
+                    "artists": artists,
+                    "album": album,
+                    "popularity": 50,
+                    "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+                    "explicit": False,
+                },
+                "context": {"uri": context, "type": "playlist", "external_urls": {"spotify": "https://open.spotify.com/playlist/x"}},
+            }
+        )
+    return year
+
+
+def encode_batches(docs: List[Dict[str, Any]], projection: Optional[Dict[str, int]] = None) -> List[bytes]:
+    # What the server would send: one reply per cursor batch, projected server-side.
+    if projection:
+        docs = [_project(doc, projection) for doc in docs]
+    return [
+        b"".join(bson.encode(doc) for doc in docs[i : i + PLAY_BATCH_SIZE]) for i in range(0, len(docs), PLAY_BATCH_SIZE)
+    ]
+
+
+def _project(doc: Dict[str, Any], projection: Dict[str, int]) -> Dict[str, Any]:
+    projected: Dict[str, Any] = {"_id": doc["_id"]}
+    for path in projection:
+        head, _, rest = path.partition(".")
+        if head not in doc:
+            continue
+        if rest:
+            if rest in doc[head]:
+                projected.setdefault(head, {})[rest] = doc[head][rest]
+        else:
+            projected[head] = doc[head]
+    return projected
+
+
+def summarize(batches: Iterable[bytes], options: CodecOptions, year: Dict[str, Any], full: bool) -> Dict[str, Any]:
+    def plays() -> Iterator[Dict[str, Any]]:
+        for batch in batches:
+            for doc in bson.decode_all(batch, options):
+                # RawBSONDocument is read-only, so every strategy pays for the same shallow copy.
+                play = dict(_as_v1(doc))
+                play["track"] = _hydrate_track(play["track"], year["tracks"], year["albums"], full=full)
+                yield play
+
+    return analytics.summarize_month_from_plays(plays())
+
+
+def measure(label: str, run: Callable[[], Any], repeat: int = 3) -> Any:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:44s} {min(timings) * 1000:8.1f} ms   peak {peak / 1e6:6.1f} MB")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plays", type=int, default=50_000, help="Plays in the synthetic year.")
+    args = parser.parse_args()
+
+    year = build_year(args.plays)
+    for schema, legacy in (("v2", False), ("v1", True)):
+        everything = encode_batches(year[schema])
+        projected = encode_batches(year[schema], _play_projection(SUMMARY_FIELDS, legacy=legacy))
+        print(
+            f"{args.plays} {schema} plays: {sum(map(len, everything)) / 1e6:.1f} MB stored, "
+            f"{sum(map(len, projected)) / 1e6:.1f} MB with the summary projection"
+        )
+        results = [
+            measure("every field, full hydration", lambda: summarize(everything, DEFAULT_CODEC_OPTIONS, year, True)),
+            measure("RawBSONDocument, full hydration", lambda: summarize(everything, RAW_OPTIONS, year, True)),
+            measure("projection, summary hydration", lambda: summarize(projected, DEFAULT_CODEC_OPTIONS, year, False)),
+        ]
+        if any(result != results[0] for result in results):
+            raise SystemExit("Summaries differ between decode strategies.")
+
+
+if __name__ == "__main__":
+    main()
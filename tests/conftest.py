@@ -0,0 +1,100 @@
+import random
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import mongomock.aggregate
+import mongomock.collection
+
+import app.playback_store
+from app.playback_store import PlaybackStore
+
+
+def _order_key(value: Any) -> Any:
+    # mongomock compares documents and mixed naive/aware datetimes poorly; the rollups rely on both.
+    if isinstance(value, dict):
+        return tuple(_order_key(item) for item in value.values())
+    if isinstance(value, datetime) and value.tzinfo:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _min_updater(doc: Dict[str, Any], field: str, value: Any) -> None:
+    if field not in doc or _order_key(value) < _order_key(doc[field]):
+        doc[field] = value
+
+
+def _max_updater(doc: Dict[str, Any], field: str, value: Any) -> None:
+    if field not in doc or _order_key(value) > _order_key(doc[field]):
+        doc[field] = value
+
+
+mongomock.collection._updaters["$min"] = _min_updater
+mongomock.collection._updaters["$max"] = _max_updater
+mongomock.aggregate._GROUPING_OPERATOR_MAP["$min"] = lambda values: min(
+    (v for v in values if v is not None), key=_order_key, default=None
+)
+mongomock.aggregate._GROUPING_OPERATOR_MAP["$max"] = lambda values: max(
+    (v for v in values if v is not None), key=_order_key, default=None
+)
+
+
+@pytest.fixture
+def mongo_client(monkeypatch):
+    """
+    In-memory mongomock client that every PlaybackStore created during the test connects to,
+    like API workers sharing a cluster.
+    """
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(app.playback_store, "AsyncIOMotorClient", lambda *args, **kwargs: client)
+    return client
+
+
+@pytest.fixture
+def make_store(mongo_client):
+    def make(**kwargs: Any) -> PlaybackStore:
+        return PlaybackStore("mongodb://localhost", "rewrapped-test", "plays", **kwargs)
+
+    return make
+
+
+def _sample_items(count: int, seed: int = 5) -> List[Dict[str, Any]]:
+    """
+    Plays as the Spotify recently-played endpoint returns them, spread over 2023, with repeats, plays
+    without a track ID, missing durations, and albums that are full, name-only (as the history
+    dump stores them) or absent.
+    """
+    rng = random.Random(seed)
+    items = []
+    for index in range(count):
+        number = rng.randrange(40)
+        album_number = number % 11
+        if album_number < 6:
+            album = {"id": f"al{album_number}", "name": f"Album {album_number}", "images": [{"url": f"img{album_number}"}]}
+        else:
+            album = {"name": f"Dump {album_number}", "images": []} if album_number < 9 else {}
+        played_at = datetime(2023, 1 + index % 12, 1 + index // 12 % 28, rng.randrange(24), rng.randrange(60), rng.randrange(60), tzinfo=timezone.utc)
+        items.append(
+            {
+                "played_at": played_at.isoformat().replace("+00:00", "Z"),
+                "track": {
+                    "id": f"t{number:02d}" if number < 34 else None,
+                    "name": f"Song {number}",
+                    "duration_ms": rng.choice([None, rng.randrange(1000, 300_000)]),
+                    "artists": [{"name": f"Artist {artist}"} for artist in sorted({number % 5, number * 7 % 9})],
+                    "album": album,
+                },
+            }
+        )
+    return items
+
+
+@pytest.fixture
+def sample_items():
+    """
+    _sample_items(count, seed=5): deterministic recently-played items for store tests.
+    """
+    return _sample_items
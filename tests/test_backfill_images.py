@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app.backfill_images
+from app.backfill_images import backfill_images
+from app.config import Settings
+from app.playback_store import PlaybackStore
+
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+ART = [{"url": "https://i.scdn.co/image/art", "width": 640, "height": 640}]
+
+
+def play(index: int, album=None) -> dict:
+    return {
+        "played_at": (START + timedelta(minutes=index)).isoformat(),
+        "track": {"id": f"t{index:03d}", "name": f"Song {index}", "duration_ms": 1000, "artists": [{"name": "Artist"}], "album": album or {}},
+    }
+
+
+def details(track_id: str, album_id: str, images=ART) -> dict:
+    return {"id": track_id, "album": {"id": album_id, "name": f"Album {album_id}", "images": images}}
+
+
+def test_queue_holds_tracks_without_art_in_id_order(make_store):
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played(
+            [play(index) for index in (4, 1, 3)] + [play(2, {"id": "al1", "name": "Has art", "images": ART})] + [play(0, {"id": "al2"})]
+        )
+        first = await store.track_ids_missing_images(limit=2)
+        rest = await store.track_ids_missing_images(limit=2, after=first[-1])
+        end = await store.track_ids_missing_images(limit=2, after=rest[-1])
+        return first, rest, end
+
+    first, rest, end = asyncio.run(run())
+    assert first == ["t000", "t001"]
+    assert rest == ["t003", "t004"]
+    assert end == []
+
+
+def test_save_album_artwork_writes_each_album_once_and_drains_the_queue(make_store):
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played([play(0, {"id": "al1", "name": "One"}), play(1, {"id": "al1", "name": "One"}), play(2), play(3)])
+        updated = await store.save_album_artwork(
+            {"t000": details("t000", "al1"), "t001": details("t001", "al1"), "t002": details("t002", "al9")},
+            # t003: Spotify had no art for it, but it was checked.
+            checked_track_ids=["t000", "t001", "t002", "t003"],
+        )
+        albums = {doc["_id"]: doc async for doc in store._albums.find({})}
+        tracks = {doc["_id"]: doc async for doc in store._tracks.find({})}
+        return updated, albums, tracks, await store.track_ids_missing_images()
+
+    updated, albums, tracks, queue = asyncio.run(run())
+    assert updated == 2
+    assert albums["al1"]["images"] == ART and albums["al1"]["name"] == "One"
+    # The dump-style track gets linked to the album Spotify reports.
+    assert tracks["t002"]["album"] == "al9"
+    assert albums["al9"] == {"_id": "al9", "images": ART, "spotify_id": "al9", "name": "Album al9"}
+    assert not any("needs_images" in track for track in tracks.values())
+    assert queue == []
+
+
+def test_save_album_artwork_skips_albums_without_art(make_store):
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played([play(0, {"id": "al1"})])
+        updated = await store.save_album_artwork({"t000": details("t000", "al1", images=[])})
+        return updated, (await store._albums.find_one({"_id": "al1"})), await store.track_ids_missing_images()
+
+    updated, album, queue = asyncio.run(run())
+    assert updated == 0
+    assert "images" not in album
+    assert queue == []
+
+
+class FakeSpotify:
+    """
+    /tracks as the backfill sees it: art for even-numbered tracks only, and records each request.
+    """
+
+    def __init__(self, settings):
+        self.requests = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def get_tracks_details(self, track_ids):
+        self.requests.append(list(track_ids))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return {track_id: details(track_id, f"al{track_id}") for track_id in track_ids if int(track_id[1:]) % 2 == 0}
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def backfill_store(mongo_client, monkeypatch):
+    settings = Settings(client_id="id", client_secret="secret", refresh_token="refresh", mongo_uri="mongodb://localhost")
+    spotify = FakeSpotify(settings)
+    monkeypatch.setattr(app.backfill_images, "get_settings", lambda: settings)
+    monkeypatch.setattr(app.backfill_images, "SpotifyClient", lambda settings: spotify)
+    return PlaybackStore.from_settings(settings), spotify
+
+
+def test_backfill_images_pages_through_the_queue_concurrently(backfill_store):
+    store, client = backfill_store
+
+    async def seed():
+        await store.save_recently_played([play(index) for index in range(230)])
+
+    async def queue():
+        return await store.track_ids_missing_images()
+
+    asyncio.run(seed())
+    asyncio.run(backfill_images(batch_limit=200, concurrency=3))
+    requested = [track_id for request in client.requests for track_id in request]
+    assert sorted(requested) == [f"t{index:03d}" for index in range(230)]
+    assert max(len(request) for request in client.requests) == 50
+    assert client.peak == 3
+    assert asyncio.run(queue()) == []
@@ -0,0 +1,25 @@
+from app.cache import TTLCache
+
+
+def test_ttl_cache_keeps_stale_entries_for_revalidation():
+    cache = TTLCache(max_entries=2)
+    cache.set("a", 1, ttl=0, etag='"a"')
+    entry = cache.lookup("a")
+    assert entry is not None and not entry.fresh and entry.etag == '"a"'
+    cache.revalidated("a", ttl=60)
+    assert cache.lookup("a").fresh
+    cache.set("b", 2, ttl=60)
+    cache.set("c", 3, ttl=60)
+    # "a" was used least recently once "b" and "c" arrived.
+    assert cache.lookup("a") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_counts_hits_and_misses():
+    cache = TTLCache()
+    assert cache.lookup("a") is None
+    cache.set("a", 1, ttl=60)
+    assert cache.lookup("a").value == 1
+    cache.discard("a")
+    assert cache.lookup("a") is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "revalidated": 0, "evictions": 0, "size": 0}
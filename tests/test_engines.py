@@ -0,0 +1,345 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app.playback_store
+
+
+RANGES = [
+    ((2023, 1, 1), (2024, 1, 1)),  # whole months from the monthly rollups
+    ((2023, 3, 1), (2023, 4, 1)),
+    ((2023, 2, 20), (2023, 5, 3)),  # days at either edge from the daily rollups
+    ((2023, 2, 17, 5, 30), (2023, 5, 3, 12)),  # not day-aligned: raw plays
+    ((2022, 1, 1), (2022, 2, 1)),  # nothing played
+]
+
+
+@pytest.fixture(autouse=True)
+def no_rebuild_settle(monkeypatch):
+    monkeypatch.setattr(app.playback_store, "ROLLUPS_REBUILD_SETTLE_SECONDS", 0.0)
+
+
+def utc(*parts):
+    return datetime(*parts, tzinfo=timezone.utc)
+
+
+async def summaries(store, limit=7):
+    return [await store.summarize_period(utc(*start), utc(*end), limit=limit) for start, end in RANGES]
+
+
+async def pipeline_summaries(store, limit=7):
+    return [await store.summarize_between(utc(*start), utc(*end), limit=limit) for start, end in RANGES]
+
+
+def test_rollups_match_the_pipeline(make_store, sample_items):
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()  # an empty database starts with built rollups
+        items = sample_items(400)
+        for offset in range(0, 400, 150):
+            await store.save_recently_played(items[offset : offset + 200])  # overlapping batches
+        assert await store._rollups_ready()
+        live = await summaries(store)
+        assert await store.check_rollups() == {"plays": 400, "rolled_up": 400}
+        assert await store.rebuild_rollups(batch_size=97) == 400
+        return live, await summaries(store), await pipeline_summaries(store)
+
+    live, rebuilt, expected = asyncio.run(run())
+    assert live == expected
+    assert rebuilt == expected
+
+
+def test_check_rollups_reports_plays_that_were_never_counted(make_store, sample_items):
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played(sample_items(50))
+        # A writer that died between inserting a play and bumping the rollups.
+        await store._collection.insert_one({"_id": utc(2023, 6, 6, 6), "v": 2, "t": "t01", "a": []})
+        return await store.check_rollups()
+
+    assert asyncio.run(run()) == {"plays": 51, "rolled_up": 50}
+
+
+def test_rebuild_in_another_process_is_noticed(make_store, monkeypatch):
+    async def run():
+        reader, rebuilder = make_store(), make_store()
+        await reader.ensure_indexes()
+        assert await reader._rollups_ready()
+        await rebuilder._state.update_one({"_id": "rollups"}, {"$set": {"built": False}})
+        monkeypatch.setattr(app.playback_store, "ROLLUPS_RECHECK_SECONDS", 0.0)
+        return await reader._rollups_ready()
+
+    assert asyncio.run(run()) is False
+
+
+def test_rebuild_refuses_to_run_while_a_scheduler_is_polling(make_store, sample_items):
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played(sample_items(20))
+        await store.save_ingest_heartbeat("worker-1", datetime.now(timezone.utc) + timedelta(minutes=5))
+        with pytest.raises(RuntimeError, match="worker-1"):
+            await store.rebuild_rollups()
+        refused = await store._rollups_ready()
+        # Long overdue: that scheduler has died.
+        await store.save_ingest_heartbeat("worker-1", datetime.now(timezone.utc) - timedelta(hours=1))
+        return refused, await store.running_schedulers(), await store.rebuild_rollups()
+
+    refused, running, counted = asyncio.run(run())
+    assert refused is True
+    assert running == []
+    assert counted == 20
+
+
+def test_writers_leave_the_counters_to_a_running_rebuild(make_store, sample_items, monkeypatch):
+    items = sample_items(60)
+
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played(items[:30])
+        recount = store._recount_rollups
+        scans, during = [], []
+
+        async def recount_while_ingesting(batch_size):
+            counted = await recount(batch_size)
+            if not scans:
+                # Inserted behind the first scan, by a writer that sees the rebuild and skips the counters.
+                await store.save_recently_played(items[30:])
+                during.append(await store.check_rollups())
+            scans.append(counted)
+            return counted
+
+        monkeypatch.setattr(store, "_recount_rollups", recount_while_ingesting)
+        counted = await store.rebuild_rollups()
+        return scans, during, counted, await store.check_rollups(), await summaries(store), await pipeline_summaries(store)
+
+    scans, during, counted, check, rebuilt, expected = asyncio.run(run())
+    assert scans == [30, 60]
+    assert during == [{"plays": 60, "rolled_up": 30}]
+    assert counted == 60
+    assert check == {"plays": 60, "rolled_up": 60}
+    assert rebuilt == expected
+
+
+def test_rebuild_gives_up_while_plays_keep_arriving(make_store, sample_items, monkeypatch):
+    items = iter(sample_items(10))
+
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        recount = store._recount_rollups
+
+        async def recount_while_ingesting(batch_size):
+            counted = await recount(batch_size)
+            await store.save_recently_played([next(items)])
+            return counted
+
+        monkeypatch.setattr(store, "_recount_rollups", recount_while_ingesting)
+        with pytest.raises(RuntimeError, match="kept arriving"):
+            await store.rebuild_rollups()
+        return await store._rollups_ready()
+
+    assert asyncio.run(run()) is False
+
+
+def test_columnar_engine_matches_the_pipeline(make_store, sample_items, tmp_path):
+    pytest.importorskip("numpy")
+
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        items = sample_items(400)
+        await store.save_recently_played(items[:200])
+        await store.enable_columnar(str(tmp_path))
+        await store.save_recently_played(items[::-1])  # out of order, half already stored
+        columnar = await summaries(store)
+        await store.close()
+
+        reloaded = make_store()
+        await reloaded.enable_columnar(str(tmp_path))  # memory-mapped from the snapshot
+        return columnar, await summaries(reloaded), await pipeline_summaries(reloaded)
+
+    columnar, reloaded, expected = asyncio.run(run())
+    assert columnar == expected
+    assert reloaded == expected
+
+
+def by_played_at(items):
+    return sorted(items, key=lambda item: item["played_at"])
+
+
+def test_columnar_snapshot_catches_up_on_newer_plays(make_store, sample_items, tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    items = by_played_at(sample_items(300))
+
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played(items[:200])
+        await store.enable_columnar(str(tmp_path))
+        await store.close()
+        # Written by another process while no API worker had the index loaded.
+        await make_store().save_recently_played(items[200:])
+
+        reloaded = make_store()
+        await reloaded.ensure_indexes()
+
+        async def no_full_load():
+            raise AssertionError("the snapshot should have been caught up")
+
+        monkeypatch.setattr(reloaded, "_load_columnar", no_full_load)
+        await reloaded.enable_columnar(str(tmp_path))
+        return len(reloaded._columnar), await summaries(reloaded), await pipeline_summaries(reloaded)
+
+    loaded, columnar, expected = asyncio.run(run())
+    assert loaded == 300
+    assert columnar == expected
+
+
+def test_columnar_snapshot_is_rebuilt_when_older_plays_were_added(make_store, sample_items, tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    items = by_played_at(sample_items(300))
+
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played(items[100:])
+        await store.enable_columnar(str(tmp_path))
+        await store.close()
+        # A dump import: everything is older than the snapshot's newest play.
+        await make_store().save_recently_played(items[:100])
+
+        reloaded = make_store()
+        await reloaded.ensure_indexes()
+        full_loads = []
+        load = reloaded._load_columnar
+
+        async def counted_load():
+            full_loads.append(True)
+            return await load()
+
+        monkeypatch.setattr(reloaded, "_load_columnar", counted_load)
+        await reloaded.enable_columnar(str(tmp_path))
+        return full_loads, await summaries(reloaded), await pipeline_summaries(reloaded)
+
+    full_loads, columnar, expected = asyncio.run(run())
+    assert full_loads == [True]
+    assert columnar == expected
+
+
+def test_columnar_recheck_catches_up_the_live_index(make_store, sample_items, monkeypatch):
+    pytest.importorskip("numpy")
+    items = by_played_at(sample_items(300))
+
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played(items[:200])
+        await store.enable_columnar()
+        index = store._columnar
+        await make_store().save_recently_played(items[200:])
+        monkeypatch.setattr(app.playback_store, "COLUMNAR_RECHECK_SECONDS", 0.0)
+        await store.summarize_period(utc(2023, 1, 1), utc(2024, 1, 1))
+        await store._columnar_reload
+        return store._columnar is index, len(index), await summaries(store), await pipeline_summaries(store)
+
+    same_index, loaded, columnar, expected = asyncio.run(run())
+    assert same_index
+    assert loaded == 300
+    assert columnar == expected
+
+
+def test_columnar_extend_unseen_skips_plays_already_indexed():
+    pytest.importorskip("numpy")
+    from app.columnar import ColumnarIndex
+
+    plays = [{"played_at": utc(2023, 1, 1, hour), "track": {"id": f"t{hour}", "artists": []}} for hour in range(6)]
+    index = ColumnarIndex()
+    index.extend(plays[:4])
+    assert index.extend_unseen(plays[2:]) == 2
+    assert len(index) == 6
+    assert index.newest_ms() == int(utc(2023, 1, 1, 5).timestamp() * 1000)
+
+
+def test_stream_engine_matches_the_pipeline(make_store, sample_items):
+    async def run():
+        store = make_store(analytics_engine="stream")
+        await store.ensure_indexes()
+        await store.save_recently_played(sample_items(400))
+        return await summaries(store), await pipeline_summaries(store)
+
+    streamed, expected = asyncio.run(run())
+    assert streamed == expected
+
+
+def test_iter_between_streams_plays_in_order_in_batches(make_store, sample_items):
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played(sample_items(120))
+        streamed = [play async for play in store.iter_between(utc(2023, 3, 1), utc(2023, 9, 1), batch_size=7)]
+        return streamed, await store.fetch_between(utc(2023, 3, 1), utc(2023, 9, 1))
+
+    streamed, fetched = asyncio.run(run())
+    assert [play["played_at"] for play in streamed] == [play["played_at"] for play in fetched]
+    assert streamed and all(utc(2023, 3, 1) <= play["played_at"] < utc(2023, 9, 1) for play in streamed)
+
+
+def test_stream_engine_merges_unmigrated_v1_plays(make_store, sample_items):
+    items = sample_items(200)
+
+    async def run():
+        store = make_store(analytics_engine="stream")
+        # Every third play stored by an older release: ISO string _id, nested track.
+        legacy = []
+        for item in items[::3]:
+            played_at = datetime.fromisoformat(item["played_at"].replace("Z", "+00:00"))
+            track = {**item["track"], "artists": [artist["name"] for artist in item["track"]["artists"]]}
+            legacy.append({"_id": played_at.isoformat(), "played_at": played_at, "track": track})
+        await store._collection.insert_many(legacy)
+        await store.ensure_indexes()
+        await store.save_recently_played([item for index, item in enumerate(items) if index % 3])
+        return await summaries(store), await pipeline_summaries(store)
+
+    streamed, expected = asyncio.run(run())
+    assert streamed == expected
+    assert streamed[0]["play_count"] == 200
+
+
+def dump_style_items(sample_items, count):
+    # The same tracks played from the API (album with an ID) and from the history dump (album name
+    # only, or none), plus plays without a track ID; the track dimension links each to its API album.
+    items = sample_items(count, seed=11)
+    for index, item in enumerate(items):
+        track = item["track"]
+        if index % 4 == 0:
+            track["album"] = {}
+        elif index % 4 == 1:
+            track["album"] = {"name": f"Dump {index % 7}", "images": []}
+        else:
+            track["album"] = {"id": f"al{index % 9}", "name": f"Album {index % 9}", "images": [{"url": f"img{index % 9}"}]}
+        if index % 10 == 0:
+            track["id"] = None
+    return items
+
+
+def test_engines_agree_on_plays_without_an_album_or_track_id(make_store, sample_items, tmp_path):
+    pytest.importorskip("numpy")
+
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played(dump_style_items(sample_items, 300))
+        expected = await pipeline_summaries(store)
+        results = {"rollups": await summaries(store)}
+        results["stream"] = await summaries(make_store(analytics_engine="stream"))
+        await store.enable_columnar(str(tmp_path))
+        results["columnar"] = await summaries(store)
+        return expected, results
+
+    expected, results = asyncio.run(run())
+    for engine, result in results.items():
+        assert result == expected, engine
@@ -0,0 +1,212 @@
+import asyncio
+import io
+import json
+import os
+import queue
+import zipfile
+
+import pytest
+
+import app.ingest_dump
+from app.config import Settings
+from app.ingest_dump import (
+    _Checkpoints,
+    _discover_sources,
+    _hash_file,
+    _open_source,
+    _parse_file,
+    ingest_dump,
+    iter_json_array,
+)
+from app.playback_store import PlaybackStore
+
+
+ROWS = [
+    {"ts": "2023-05-01T10:00:00Z", "master_metadata_track_name": "a, [b] {c}", "ms_played": 1234},
+    {"ts": "2023-05-01T10:05:00Z", "master_metadata_track_name": "été \"quoted\"", "ms_played": -1.5},
+    [1, 2, {"nested": []}],
+    "plain string",
+    -12.75,
+    True,
+    None,
+    {},
+]
+
+
+def dump_row(index: int) -> dict:
+    return {
+        "ts": f"2023-05-01T10:{index // 60:02d}:{index % 60:02d}Z",
+        "spotify_track_uri": f"spotify:track:t{index}",
+        "master_metadata_track_name": f"Song {index}",
+        "master_metadata_album_artist_name": "Artist",
+        "master_metadata_album_album_name": "Album",
+        "ms_played": 1000 + index,
+    }
+
+
+@pytest.fixture
+def dump_store(mongo_client, monkeypatch):
+    # ingest_dump builds its own store from settings; point it at the test database.
+    settings = Settings(client_id="id", client_secret="secret", refresh_token="refresh", mongo_uri="mongodb://localhost")
+    monkeypatch.setattr(app.ingest_dump, "get_settings", lambda: settings)
+    return PlaybackStore.from_settings(settings)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 16, 1 << 16])
+def test_iter_json_array_across_chunk_boundaries(chunk_size):
+    text = " \n[ " + " ,\n ".join(json.dumps(row, ensure_ascii=False) for row in ROWS) + " ]\n"
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == ROWS
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ \n ]  "])
+def test_iter_json_array_empty(text):
+    assert list(iter_json_array(io.StringIO(text), chunk_size=2)) == []
+
+
+@pytest.mark.parametrize("text", ['{"ts": 1}', "[1, 2", "[1 2]"])
+def test_iter_json_array_rejects_malformed_input(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), chunk_size=2))
+
+
+def test_ingest_dump_parses_in_spawned_processes(dump_store, tmp_path):
+    (tmp_path / "Streaming_History_Audio_2023_0.json").write_text(json.dumps([dump_row(i) for i in range(0, 120)]))
+    (tmp_path / "Streaming_History_Audio_2023_1.json").write_text(json.dumps([dump_row(i) for i in range(100, 250)]))
+    asyncio.run(ingest_dump(str(tmp_path / "*.json"), batch_size=40, parse_workers=2, writers=2))
+
+    async def stored():
+        return await dump_store._collection.count_documents({})
+
+    assert asyncio.run(stored()) == 250
+
+
+def test_parse_file_resumes_after_committed_rows(tmp_path):
+    path = tmp_path / "Streaming_History_Audio_2023.json"
+    path.write_text(json.dumps([dump_row(index) for index in range(10)]), encoding="utf-8")
+    batches = queue.Queue()
+
+    assert _parse_file(str(path), None, "dump:x", 4, 3, batches) == 10
+    messages = [batches.get_nowait() for _ in range(batches.qsize())]
+    assert [(start, end, final) for _, start, end, _, final in messages] == [(4, 7, False), (7, 10, False), (10, 10, True)]
+    assert [item["track"]["id"] for message in messages for item in message[3]] == [f"t{index}" for index in range(4, 10)]
+
+
+def test_checkpoints_persist_only_the_contiguous_prefix():
+    saved = []
+
+    class Store:
+        async def save_import_checkpoint(self, key, source, rows_committed, completed, fingerprint=None):
+            saved.append((rows_committed, completed))
+
+    async def run():
+        checkpoints = _Checkpoints(Store(), {"dump:x": "history.json"}, {"dump:x": 100})
+        # Writers finish out of order; nothing past a gap may be recorded as committed.
+        await checkpoints.commit("dump:x", 200, 300, False)
+        await checkpoints.commit("dump:x", 300, 350, True)
+        assert saved == []
+        await checkpoints.commit("dump:x", 100, 200, False)
+
+    asyncio.run(run())
+    assert saved == [(350, True)]
+
+
+def test_import_checkpoints_round_trip(make_store):
+    async def run():
+        store = make_store()
+        await store.save_import_checkpoint("dump:x", "history.json", 500, False)
+        # A slower writer reporting an older position does not move the checkpoint back.
+        await store.save_import_checkpoint("dump:x", "history.json", 300, False)
+        await store.save_import_checkpoint("dump:y", "other.json", 40, True)
+        return await store.get_import_checkpoints(["dump:x", "dump:y", "dump:z"])
+
+    checkpoints = asyncio.run(run())
+    assert checkpoints["dump:x"]["rows_committed"] == 500 and not checkpoints["dump:x"].get("completed")
+    assert checkpoints["dump:y"]["completed"] is True
+    assert "dump:z" not in checkpoints
+
+
+def count_plays(store):
+    async def count():
+        return await store._collection.count_documents({})
+
+    return asyncio.run(count())
+
+
+def test_ingest_dump_resumes_after_the_committed_rows(dump_store, tmp_path):
+    path = tmp_path / "Streaming_History_Audio_2023_0.json"
+    path.write_text(json.dumps([dump_row(i) for i in range(250)]))
+    asyncio.run(dump_store.save_import_checkpoint(f"dump:{_hash_file(str(path))}", path.name, 100, False))
+
+    asyncio.run(ingest_dump(str(path), batch_size=40))
+    # Rows before the checkpoint count as written by the interrupted run.
+    assert count_plays(dump_store) == 150
+
+
+def test_unchanged_files_are_skipped_without_hashing(dump_store, tmp_path):
+    path = tmp_path / "Streaming_History_Audio_2023_0.json"
+    path.write_text(json.dumps([dump_row(i) for i in range(100, 150)]))
+    asyncio.run(ingest_dump(str(path), batch_size=40))
+    stat = os.stat(path)
+
+    # Same size and mtime but new rows: only a hash would notice, so a skip proves none was taken.
+    path.write_text(json.dumps([dump_row(i) for i in range(150, 200)]))
+    assert os.stat(path).st_size == stat.st_size
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    asyncio.run(ingest_dump(str(path), batch_size=40))
+    assert count_plays(dump_store) == 50
+
+    # A changed mtime means the file is hashed again, and new content is imported.
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    asyncio.run(ingest_dump(str(path), batch_size=40))
+    assert count_plays(dump_store) == 100
+
+
+def write_export(path, members):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, rows in members.items():
+            archive.writestr(name, json.dumps(rows))
+
+
+def test_discover_sources_expands_export_archives(tmp_path):
+    write_export(
+        tmp_path / "my_spotify_data.zip",
+        {
+            "Spotify Extended Streaming History/Streaming_History_Audio_2023_1.json": [],
+            "Spotify Extended Streaming History/Streaming_History_Audio_2022.json": [],
+            "Spotify Extended Streaming History/Streaming_History_Video_2023.json": [],
+            "ReadMeFirst.pdf": [],
+        },
+    )
+    (tmp_path / "Streaming_History_Audio_2021.json").write_text("[]")
+
+    sources = _discover_sources(str(tmp_path / "*"), "Streaming_History_Audio*.json")
+    archive = str(tmp_path / "my_spotify_data.zip")
+    assert sources == [
+        (str(tmp_path / "Streaming_History_Audio_2021.json"), None),
+        (archive, "Spotify Extended Streaming History/Streaming_History_Audio_2022.json"),
+        (archive, "Spotify Extended Streaming History/Streaming_History_Audio_2023_1.json"),
+    ]
+
+
+def test_archive_members_stream_without_extracting(tmp_path):
+    rows = [dump_row(i) for i in range(30)]
+    write_export(tmp_path / "export.zip", {"Streaming_History_Audio_2023.json": rows})
+
+    with _open_source(str(tmp_path / "export.zip"), "Streaming_History_Audio_2023.json") as fp:
+        assert list(iter_json_array(fp, chunk_size=7)) == rows
+    assert sorted(os.listdir(tmp_path)) == ["export.zip"]
+
+
+def test_ingest_dump_imports_straight_from_the_export_zip(dump_store, tmp_path):
+    write_export(
+        tmp_path / "my_spotify_data.zip",
+        {
+            "Streaming_History_Audio_2023_0.json": [dump_row(i) for i in range(0, 80)],
+            "Streaming_History_Audio_2023_1.json": [dump_row(i) for i in range(80, 130)],
+            "Streaming_History_Video_2023.json": [dump_row(i) for i in range(500, 520)],
+        },
+    )
+    asyncio.run(ingest_dump(str(tmp_path / "my_spotify_data.zip"), batch_size=40))
+    assert count_plays(dump_store) == 130
+    assert sorted(os.listdir(tmp_path)) == ["my_spotify_data.zip"]
+
@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.ingest_recent import RECENT_PAGE_SIZE, ingest_recent_plays
+
+
+START = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+
+
+def recent_item(minute: int) -> dict:
+    played_at = START + timedelta(minutes=minute)
+    return {
+        "played_at": played_at.isoformat().replace("+00:00", "Z"),
+        "track": {"id": f"t{minute}", "name": f"Song {minute}", "duration_ms": 1000, "artists": [{"name": "Artist"}], "album": {}},
+    }
+
+
+class FakeClient:
+    """
+    Recently played as Spotify serves it: newest first, at most max_items, only plays after after_ms.
+    """
+
+    def __init__(self, plays):
+        self.plays = plays
+        self.calls = []
+
+    async def get_recently_played(self, max_items, after_ms=None):
+        self.calls.append(after_ms)
+        newer = [item for item in self.plays if after_ms is None or _ms(item["played_at"]) > after_ms]
+        return sorted(newer, key=lambda item: item["played_at"], reverse=True)[:max_items]
+
+
+def _ms(played_at: str) -> int:
+    return int(datetime.fromisoformat(played_at.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+def test_polls_only_plays_after_the_high_water_mark(make_store):
+    async def run():
+        store = make_store()
+        client = FakeClient([recent_item(minute) for minute in range(10)])
+        first = await ingest_recent_plays(client, store)
+        client.plays += [recent_item(minute) for minute in range(10, 13)]
+        second = await ingest_recent_plays(client, store)
+        quiet = await ingest_recent_plays(client, store)
+        return client.calls, first, second, quiet, await store.get_recent_high_water()
+
+    calls, first, second, quiet, high_water = asyncio.run(run())
+    assert calls == [None, _ms(recent_item(9)["played_at"]), _ms(recent_item(12)["played_at"])]
+    assert first == {"fetched": 10, "inserted": 10, "skipped": 0, "overflow": False, "newest_played_at": START + timedelta(minutes=9)}
+    assert (second["fetched"], second["inserted"]) == (3, 3)
+    # Nothing new: the mark stays where it was.
+    assert quiet == {"fetched": 0, "inserted": 0, "skipped": 0, "overflow": False, "newest_played_at": START + timedelta(minutes=12)}
+    assert high_water == START + timedelta(minutes=12)
+
+
+def test_full_page_after_the_mark_is_reported_as_overflow(make_store):
+    async def run():
+        store = make_store()
+        client = FakeClient([recent_item(0)])
+        first = await ingest_recent_plays(client, store)
+        client.plays += [recent_item(minute) for minute in range(1, RECENT_PAGE_SIZE + 20)]
+        second = await ingest_recent_plays(client, store)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first["overflow"] is False
+    assert second["overflow"] is True
+    assert second["fetched"] == RECENT_PAGE_SIZE
+    assert second["newest_played_at"] == START + timedelta(minutes=RECENT_PAGE_SIZE + 19)
+
+
+def test_first_poll_is_never_overflow(make_store):
+    async def run():
+        client = FakeClient([recent_item(minute) for minute in range(RECENT_PAGE_SIZE * 2)])
+        return await ingest_recent_plays(client, make_store())
+
+    assert asyncio.run(run())["overflow"] is False
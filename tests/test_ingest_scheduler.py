@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import app.ingest_scheduler
+from app.ingest_scheduler import IngestScheduler
+
+
+def poll(fetched, overflow=False, newest=None):
+    return {"fetched": fetched, "inserted": fetched, "skipped": 0, "overflow": overflow, "newest_played_at": newest}
+
+
+def make_scheduler(**kwargs):
+    return IngestScheduler(None, None, min_interval=60, max_interval=900, target_fill=0.5, **kwargs)
+
+
+def test_adapt_targets_half_a_page_per_poll():
+    scheduler = make_scheduler()
+    scheduler._adapt(poll(10), polled_at=0)
+    # One poll gives no rate yet.
+    assert scheduler.interval == 60 and scheduler._plays_per_second is None
+    scheduler._adapt(poll(100), polled_at=1000)
+    # 0.1 plays/s: 25 plays (half of the 50-play window) arrive every 250s.
+    assert scheduler.interval == 250
+    scheduler._adapt(poll(0), polled_at=1250)
+    # Weighted 0.3 new / 0.7 old, so one quiet poll only slows it down a little.
+    assert round(scheduler._plays_per_second, 6) == 0.07
+    assert round(scheduler.interval) == round(25 / 0.07)
+
+
+def test_adapt_stays_within_bounds():
+    scheduler = make_scheduler()
+    scheduler._adapt(poll(0), polled_at=0)
+    scheduler._adapt(poll(1), polled_at=10_000)
+    assert scheduler.interval == 900
+    scheduler._adapt(poll(50), polled_at=10_001)
+    assert scheduler.interval == 60
+
+
+def test_adapt_overflow_and_silence():
+    scheduler = make_scheduler()
+    scheduler._adapt(poll(0), polled_at=0)
+    scheduler._adapt(poll(0), polled_at=600)
+    assert scheduler.interval == 900
+    scheduler._adapt(poll(50, overflow=True), polled_at=1500)
+    assert scheduler.interval == 60
+
+
+def test_status_after_success_and_failure(monkeypatch):
+    newest = datetime.now(timezone.utc) - timedelta(minutes=5)
+    results = [poll(4, newest=newest), RuntimeError("Spotify is down")]
+
+    async def fake_ingest(client, store):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(app.ingest_scheduler, "ingest_recent_plays", fake_ingest)
+    scheduler = make_scheduler()
+    asyncio.run(scheduler.run_once())
+    status = scheduler.status()
+    assert status["runs"] == 1 and status["failures"] == 0
+    assert status["last_result"]["fetched"] == 4
+    assert 299 <= status["lag_seconds"] <= 310
+    assert status["running"] is False
+    assert status["interval_seconds"] == 60
+
+    asyncio.run(scheduler.run_once())
+    status = scheduler.status()
+    assert status["runs"] == 2 and status["failures"] == 1
+    assert status["last_error"] == "RuntimeError('Spotify is down')"
+    # A failure backs off, and the last good poll is still reported.
+    assert status["interval_seconds"] == 120
+    assert status["newest_played_at"] == newest
+    assert status["seconds_since_success"] is not None
+
+
+def test_running_scheduler_keeps_a_heartbeat(make_store, monkeypatch):
+    async def fake_ingest(client, store):
+        return poll(0)
+
+    monkeypatch.setattr(app.ingest_scheduler, "ingest_recent_plays", fake_ingest)
+
+    async def run():
+        store = make_store()
+        scheduler = IngestScheduler(None, store, min_interval=60, max_interval=900)
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        running = await store.running_schedulers()
+        await scheduler.stop()
+        return scheduler.name, running, await store.running_schedulers()
+
+    name, running, stopped = asyncio.run(run())
+    assert running == [name]
+    assert stopped == []
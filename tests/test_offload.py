@@ -0,0 +1,96 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from app.offload import AnalyticsOffload, LoopLagMonitor
+
+
+def current_thread():
+    return threading.get_ident()
+
+
+def run_with(offload, func, size, picklable=True):
+    async def run():
+        try:
+            return threading.get_ident(), await offload.run(func, size=size, picklable=picklable)
+        finally:
+            offload.close()
+
+    return asyncio.run(run())
+
+
+def test_small_work_runs_inline_on_the_loop():
+    offload = AnalyticsOffload(executor="thread", threshold=100)
+    loop_thread, ran_on = run_with(offload, current_thread, size=99)
+    assert ran_on == loop_thread
+    assert offload.stats()["inline"] == 1 and offload.stats()["offloaded"] == 0
+
+
+def test_work_at_the_threshold_goes_to_a_thread():
+    offload = AnalyticsOffload(executor="thread", threshold=100)
+    loop_thread, ran_on = run_with(offload, current_thread, size=100)
+    assert ran_on != loop_thread
+    assert offload.stats()["offloaded"] == 1
+
+
+def test_inline_executor_never_offloads():
+    offload = AnalyticsOffload(executor="inline", threshold=0)
+    loop_thread, ran_on = run_with(offload, current_thread, size=10**6)
+    assert ran_on == loop_thread
+
+
+def test_process_executor_runs_picklable_work_in_another_process():
+    offload = AnalyticsOffload(executor="process", workers=1, threshold=0)
+    _, pid = run_with(offload, os.getpid, size=1)
+    assert pid != os.getpid()
+
+
+def test_shared_state_stays_in_a_thread_with_the_process_executor():
+    offload = AnalyticsOffload(executor="process", threshold=0)
+    loop_thread, ran_on = run_with(offload, current_thread, size=1, picklable=False)
+    assert ran_on != loop_thread
+    assert offload._processes is None
+
+
+def test_unknown_executor_is_rejected():
+    with pytest.raises(ValueError, match="ANALYTICS_EXECUTOR"):
+        AnalyticsOffload(executor="fork")
+
+
+def test_streaming_summary_is_tallied_in_the_pool(make_store, sample_items):
+    async def run():
+        offload = AnalyticsOffload(executor="thread", threshold=50)
+        store = make_store(analytics_engine="stream", offload=offload)
+        await store.ensure_indexes()
+        await store.save_recently_played(sample_items(300))
+        start, end = datetime(2023, 1, 1, tzinfo=timezone.utc), datetime(2024, 1, 1, tzinfo=timezone.utc)
+        summary = await store.summarize_streaming(start, end)
+        expected = await store.summarize_between(start, end)
+        return summary, expected, offload.stats()
+
+    summary, expected, stats = asyncio.run(run())
+    assert summary == expected
+    assert stats["offloaded"] >= 1
+
+
+def test_loop_lag_monitor_reports_a_blocked_loop():
+    async def run():
+        monitor = LoopLagMonitor(interval=0.02)
+        before = monitor.stats()
+        monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)  # holds the loop, like a large summary counted inline
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return before, monitor.stats()
+
+    before, after = asyncio.run(run())
+    assert before["last_ms"] is None and before["max_ms_since_start"] == 0.0
+    assert after["max_ms"] >= 150
+    assert after["max_ms_since_start"] == after["max_ms"]
+    assert after["mean_ms"] < after["max_ms"]
+    assert after["window_seconds"] > 0
@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app import analytics
+
+
+YEAR = (datetime(2023, 1, 1, tzinfo=timezone.utc), datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+
+def as_plays(items):
+    # The plays analytics.summarize_month_from_plays expects, straight from the API items.
+    plays = []
+    for item in items:
+        track = item["track"]
+        played_at = datetime.fromisoformat(item["played_at"].replace("Z", "+00:00"))
+        plays.append({"played_at": played_at, "track": {**track, "artists": [artist["name"] for artist in track["artists"]]}})
+    return sorted(plays, key=lambda play: play["played_at"])
+
+
+def test_save_recently_played_skips_plays_already_stored(make_store, sample_items):
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        items = sample_items(60)
+        first = await store.save_recently_played(items[:40])
+        second = await store.save_recently_played(items[20:])
+        return first, second, await store._collection.count_documents({})
+
+    first, second, stored = asyncio.run(run())
+    assert first == {"inserted": 40, "skipped": 0}
+    assert second == {"inserted": 20, "skipped": 20}
+    assert stored == 60
+
+
+def test_insert_documents_reraises_errors_other_than_duplicates(make_store):
+    store = make_store()
+    failure = BulkWriteError({"writeErrors": [{"index": 0, "code": 11000}, {"index": 1, "code": 121}], "writeConcernErrors": []})
+
+    async def insert_many(docs, ordered):
+        raise failure
+
+    store._collection.insert_many = insert_many
+    with pytest.raises(BulkWriteError):
+        asyncio.run(store._insert_documents([{"_id": 1}, {"_id": 2}]))
+
+
+def test_insert_documents_returns_only_the_new_documents(make_store):
+    store = make_store()
+    failure = BulkWriteError({"writeErrors": [{"index": 1, "code": 11000}], "writeConcernErrors": []})
+
+    async def insert_many(docs, ordered):
+        assert ordered is False
+        raise failure
+
+    store._collection.insert_many = insert_many
+    assert asyncio.run(store._insert_documents([{"_id": 1}, {"_id": 2}, {"_id": 3}])) == [{"_id": 1}, {"_id": 3}]
+
+
+@pytest.mark.parametrize("limit", [1, 10, 50])
+def test_pipeline_summary_matches_python_summary(make_store, sample_items, limit):
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        items = sample_items(300)
+        await store.save_recently_played(items)
+        return items, await store.summarize_between(*YEAR, limit=limit), await store.fetch_between(*YEAR)
+
+    items, summary, stored = asyncio.run(run())
+    assert summary == analytics.summarize_month_from_plays(as_plays(items), limit=limit)
+    assert summary == analytics.summarize_month_from_plays(stored, limit=limit)
+
+
+def test_pipeline_summary_of_an_empty_range(make_store):
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        return await store.summarize_between(*YEAR)
+
+    assert asyncio.run(run()) == analytics.summarize_month_from_plays([])
+
+
+def test_name_only_albums_are_told_apart_by_artist(make_store):
+    def dump_item(minute, artist, album="Greatest Hits"):
+        track = {"id": f"{artist}{minute}", "name": "Song", "duration_ms": 60000, "artists": [{"name": artist}], "album": {"name": album}}
+        return {"played_at": f"2023-05-01T10:{minute:02d}:00Z", "track": track}
+
+    async def run():
+        store = make_store()
+        # An older play that still embeds its name-only album.
+        await store._collection.insert_one(
+            {
+                "_id": "legacy",
+                "played_at": datetime(2023, 5, 1, 9),
+                "track": {"id": "C0", "name": "Song", "duration_ms": 60000, "artists": ["Artist C"], "album": {"name": "Greatest Hits"}},
+            }
+        )
+        await store.ensure_indexes()
+        await store.save_recently_played([dump_item(0, "Artist A"), dump_item(1, "Artist A"), dump_item(2, "Artist B")])
+        albums = sorted([doc["_id"] async for doc in store._albums.find({})])
+        return albums, await store.summarize_between(*YEAR), await store.summarize_streaming(*YEAR)
+
+    albums, pipeline, streamed = asyncio.run(run())
+    assert albums == ["Greatest Hits|Artist A", "Greatest Hits|Artist B"]
+    assert pipeline == streamed
+    assert pipeline["unique_albums"] == 3
+    assert [(row["id"], row["name"], row["play_count"]) for row in pipeline["top_albums"]] == [
+        ("Greatest Hits|Artist A", "Greatest Hits", 2),
+        ("Greatest Hits|Artist C", "Greatest Hits", 1),
+        ("Greatest Hits|Artist B", "Greatest Hits", 1),
+    ]
+
+
+def test_resent_plays_are_not_copied_while_v1_plays_remain(make_store, sample_items):
+    async def run():
+        store = make_store()
+        items = sample_items(30)
+        plays = as_plays(items)
+        # Stored by an older release: ISO string _id, nested track.
+        await store._collection.insert_many(
+            [{"_id": play["played_at"].isoformat(), "played_at": play["played_at"], "track": play["track"]} for play in plays[:10]]
+        )
+        await store.ensure_indexes()
+        counts = await store.save_recently_played(items)
+        return counts, await store.fetch_between(*YEAR)
+
+    counts, stored = asyncio.run(run())
+    assert counts == {"inserted": 20, "skipped": 10}
+    assert len(stored) == 30
+    assert all(play["played_at"].tzinfo is not None for play in stored)
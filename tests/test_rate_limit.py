@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from app.rate_limit import AdaptiveConcurrency, TokenBucket
+
+
+def test_token_bucket_allows_a_burst_then_paces_at_rate():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=5)
+        started = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        burst = time.monotonic() - started
+        for _ in range(5):
+            await bucket.acquire()
+        return burst, time.monotonic() - started
+
+    burst, total = asyncio.run(run())
+    assert burst < 0.05
+    # Five more tokens at 50/s take about 0.1s.
+    assert 0.08 <= total < 0.5
+
+
+def test_token_bucket_pause_holds_every_caller():
+    async def run():
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.pause(0.1)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_token_bucket_paces_callers_after_a_pause():
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=20)
+        for _ in range(20):
+            await bucket.acquire()
+        bucket.pause(0.3)
+        paused = time.monotonic()
+        finished = []
+        for _ in range(6):
+            await bucket.acquire()
+            finished.append(time.monotonic() - paused)
+        return finished
+
+    finished = asyncio.run(run())
+    # The pause does not count as refill time: tokens trickle in at 20/s once it is over.
+    assert finished[0] >= 0.3
+    assert all(later - earlier >= 0.04 for earlier, later in zip(finished, finished[1:]))
+    assert finished[-1] >= 0.55
+
+
+def test_adaptive_concurrency_caps_in_flight_requests():
+    async def run():
+        limiter = AdaptiveConcurrency(initial=3, maximum=3)
+        peak = 0
+
+        async def task():
+            nonlocal peak
+            async with limiter:
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(task() for _ in range(12)))
+        return peak, limiter.in_flight
+
+    assert asyncio.run(run()) == (3, 0)
+
+
+def test_adaptive_concurrency_halves_on_throttle_and_grows_back():
+    limiter = AdaptiveConcurrency(initial=8, minimum=1, maximum=8)
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    limiter.on_throttle()
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.limit == 1
+    # One step up per full window of successes.
+    limiter.on_success()
+    assert limiter.limit == 2
+    limiter.on_success()
+    assert limiter.limit == 2
+    limiter.on_success()
+    assert limiter.limit == 3
+
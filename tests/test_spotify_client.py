@@ -0,0 +1,196 @@
+import asyncio
+
+import httpx
+
+from app.config import Settings
+from app.spotify_client import SpotifyClient
+
+
+def make_client(handler, **settings) -> SpotifyClient:
+    settings = {"spotify_rate_burst": 100, **settings}
+    client = SpotifyClient(Settings(client_id="id", client_secret="secret", refresh_token="refresh", **settings))
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_concurrent_callers_share_one_token_refresh():
+    calls = {"token": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/token"):
+            calls["token"] += 1
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"access_token": f"token-{calls['token']}", "expires_in": 3600})
+        return httpx.Response(200, json={"token": request.headers["Authorization"]})
+
+    async def run():
+        client = make_client(handler)
+        try:
+            return await asyncio.gather(*(client._request("GET", "/me") for _ in range(10)))
+        finally:
+            await client.close()
+
+    responses = asyncio.run(run())
+    assert calls["token"] == 1
+    assert {response["token"] for response in responses} == {"Bearer token-1"}
+
+
+def test_rejected_token_is_refreshed_once_and_retried():
+    calls = {"token": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/token"):
+            calls["token"] += 1
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"access_token": f"token-{calls['token']}", "expires_in": 3600})
+        if request.headers["Authorization"] == "Bearer token-1":
+            return httpx.Response(401)
+        return httpx.Response(200, json={"token": request.headers["Authorization"]})
+
+    async def run():
+        client = make_client(handler)
+        try:
+            await client._ensure_token()
+            return await asyncio.gather(*(client._request("GET", "/me") for _ in range(5)))
+        finally:
+            await client.close()
+
+    responses = asyncio.run(run())
+    assert calls["token"] == 2
+    assert {response["token"] for response in responses} == {"Bearer token-2"}
+
+
+def test_failed_refresh_reaches_every_waiter_and_is_retried_next_time():
+    calls = {"token": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls["token"] += 1
+        await asyncio.sleep(0.01)
+        if calls["token"] == 1:
+            return httpx.Response(400, json={"error": "invalid_grant"})
+        return httpx.Response(200, json={"access_token": "token-2", "expires_in": 3600})
+
+    async def run():
+        client = make_client(handler)
+        try:
+            results = await asyncio.gather(*(client._ensure_token() for _ in range(5)), return_exceptions=True)
+            return results, await client._ensure_token()
+        finally:
+            await client.close()
+
+    results, token = asyncio.run(run())
+    assert all(isinstance(result, httpx.HTTPStatusError) for result in results)
+    assert token == "token-2"
+    assert calls["token"] == 2
+
+
+def page_handler(total, requested, delays=None, in_flight=None):
+    """
+    /me/top/tracks as Spotify pages it: `total` items, numbered by position.
+    """
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/token"):
+            return httpx.Response(200, json={"access_token": "token", "expires_in": 3600})
+        offset, limit = int(request.url.params["offset"]), int(request.url.params["limit"])
+        requested.append((offset, limit))
+        if in_flight is not None:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        await asyncio.sleep((delays or {}).get(offset, 0.001))
+        if in_flight is not None:
+            in_flight["now"] -= 1
+        items = [{"n": n} for n in range(offset, min(total, offset + limit))]
+        return httpx.Response(200, json={"items": items, "total": total})
+
+    return handler
+
+
+def paginate(handler, max_items, **settings):
+    async def run():
+        client = make_client(handler, **settings)
+        try:
+            return await client._paginate("/me/top/tracks", {"time_range": "short_term"}, max_items=max_items)
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+def test_paginate_keeps_page_order_when_pages_finish_out_of_order():
+    requested = []
+    # Later pages answer first.
+    items = paginate(page_handler(500, requested, delays={0: 0.05, 50: 0.03, 100: 0.01}), max_items=130)
+    assert [item["n"] for item in items] == list(range(130))
+    assert sorted(requested) == [(0, 50), (50, 50), (100, 30)]
+
+
+def test_paginate_stops_at_the_first_short_page():
+    requested = []
+    items = paginate(page_handler(120, requested), max_items=300)
+    assert [item["n"] for item in items] == list(range(120))
+
+
+def test_paginate_skips_queued_pages_past_the_reported_total():
+    requested = []
+    paginate(page_handler(60, requested), max_items=300, spotify_page_concurrency=1)
+    assert requested == [(0, 50), (50, 50)]
+
+
+def test_paginate_bounds_concurrent_pages():
+    requested, in_flight = [], {"now": 0, "peak": 0}
+    items = paginate(page_handler(1000, requested, delays={}, in_flight=in_flight), max_items=400, spotify_page_concurrency=3)
+    assert len(items) == 400
+    assert in_flight["peak"] == 3
+
+
+def test_stale_cache_entry_is_revalidated_with_etag():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/token"):
+            return httpx.Response(200, json={"access_token": "token", "expires_in": 3600})
+        seen.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json={"display_name": "listener"}, headers={"ETag": '"v1"'})
+
+    async def run():
+        client = make_client(handler)
+        try:
+            first = await client._cached_get("/me", None, ttl=60)
+            cached = await client._cached_get("/me", None, ttl=60)
+            client._cache.lookup(("/me", ())).expires_at = 0  # let the entry go stale
+            revalidated = await client._cached_get("/me", None, ttl=60)
+            return first, cached, revalidated, client._cache.stats()
+        finally:
+            await client.close()
+
+    first, cached, revalidated, stats = asyncio.run(run())
+    assert first == cached == revalidated == {"display_name": "listener"}
+    assert seen == [None, '"v1"']
+    assert stats["revalidated"] == 1
+
+
+def test_uncached_calls_skip_the_cache():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/token"):
+            return httpx.Response(200, json={"access_token": "token", "expires_in": 3600})
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"display_name": "listener"}, headers={"ETag": '"v1"'})
+
+    async def run():
+        client = make_client(handler)
+        try:
+            for _ in range(2):
+                await client._cached_get("/me", None, ttl=0)
+            return client._cache.stats()
+        finally:
+            await client.close()
+
+    stats = asyncio.run(run())
+    assert calls == ["/v1/me", "/v1/me"]
+    assert stats["size"] == 0
+
@@ -0,0 +1,107 @@
+import asyncio
+from datetime import date, datetime, timezone
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app import analytics
+from app.routers.wrapped import _fetch_sections, range_wrapped
+
+
+async def section(value, delay, cancelled=None):
+    try:
+        await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        if cancelled is not None:
+            cancelled.append(value)
+        raise
+    return value
+
+
+def test_fetch_sections_without_deadline_waits_for_everything():
+    async def run():
+        return await _fetch_sections({"fast": section(1, 0.001), "slow": section(2, 0.05)}, None)
+
+    assert asyncio.run(run()) == ({"fast": 1, "slow": 2}, [])
+
+
+def test_fetch_sections_returns_what_finished_by_the_deadline():
+    cancelled = []
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        result = await _fetch_sections(
+            {"profile": section("me", 0.001), "top_tracks": section([1], 0.01), "recent": section([2], 5, cancelled)},
+            deadline_ms=100,
+        )
+        return result, asyncio.get_running_loop().time() - started
+
+    (sections, missing), elapsed = asyncio.run(run())
+    assert sections == {"profile": "me", "top_tracks": [1]}
+    assert missing == ["recent"]
+    assert cancelled == [[2]]
+    assert elapsed < 1
+
+
+def test_fetch_sections_maps_the_first_failure_and_cancels_the_rest():
+    cancelled = []
+    response = httpx.Response(429, headers={"Retry-After": "7"}, request=httpx.Request("GET", "https://api.spotify.com/v1/me"))
+
+    async def throttled():
+        await asyncio.sleep(0.001)
+        raise httpx.HTTPStatusError("throttled", request=response.request, response=response)
+
+    async def run():
+        await _fetch_sections({"profile": throttled(), "top_tracks": section([1], 5, cancelled)}, deadline_ms=1000)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 429
+    assert error.value.headers == {"Retry-After": "7"}
+    assert cancelled == [[1]]
+
+
+def test_fetch_sections_reraises_errors_that_are_not_upstream():
+    async def broken():
+        raise KeyError("items")
+
+    with pytest.raises(KeyError):
+        asyncio.run(_fetch_sections({"top_tracks": broken()}, None))
+
+
+def test_range_wrapped_serves_any_span_of_days(make_store, sample_items):
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played(sample_items(200))
+        ranged = await range_wrapped(start=date(2023, 2, 20), end=date(2023, 5, 3), limit=5, store=store)
+        expected = await store.summarize_between(
+            datetime(2023, 2, 20, tzinfo=timezone.utc), datetime(2023, 5, 3, tzinfo=timezone.utc), limit=5
+        )
+        all_time = await range_wrapped(start=None, end=date(2024, 1, 1), limit=5, store=store)
+        return ranged, expected, all_time, await store.first_played_at()
+
+    ranged, expected, all_time, first = asyncio.run(run())
+    assert ranged == {"start": "2023-02-20T00:00:00+00:00", "end": "2023-05-03T00:00:00+00:00", "days": 72, **expected}
+    # Without start: from the day of the first stored play.
+    assert all_time["start"] == first.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+    assert all_time["play_count"] == 200
+
+
+def test_range_wrapped_before_the_first_play_is_empty(make_store, sample_items):
+    async def run():
+        store = make_store()
+        await store.ensure_indexes()
+        await store.save_recently_played(sample_items(20))
+        return await range_wrapped(start=None, end=date(2020, 1, 1), limit=5, store=store)
+
+    result = asyncio.run(run())
+    empty = analytics.summarize_month_from_plays([])
+    assert result == {"start": "2020-01-01T00:00:00+00:00", "end": "2020-01-01T00:00:00+00:00", "days": 0, **empty}
+
+
+def test_range_wrapped_rejects_a_start_after_the_end(make_store):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(range_wrapped(start=date(2024, 2, 1), end=date(2024, 1, 1), limit=5, store=make_store()))
+    assert error.value.status_code == 400